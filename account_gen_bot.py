@@ -1,3 +1,4 @@
+import aiohttp
 import discord
 from discord.ext import commands
 import os
@@ -6,33 +7,125 @@ import datetime
 from dotenv import load_dotenv
 import random
 import asyncio
+import signal
+import collections
+import functools
+import gzip
+import hashlib
+import mmap
+import queue
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+import types
+from array import array
 
 # --- Carrega variáveis de ambiente ---
 load_dotenv()
 
 # --- Configurações do Bot ---
-ACCOUNTS_FILE = "accounts.json"      # Arquivo que armazena as contas em formato JSON
+ACCOUNTS_FILE = "accounts.json"      # Contas em formato JSON (importação/exportação)
+SNAPSHOT_FILE = "accounts.snap"      # Snapshot binário das contas (formato principal)
+INDEX_FILE = "accounts.idx"          # Índice de hashes das contas já cadastradas
+JOURNAL_FILE = "accounts.journal"    # Diário das alterações feitas desde o último snapshot
+WAITLIST_FILE = "gen_bot_waitlist.json"  # Filas de espera por reabastecimento
+QUOTAS_FILE = "gen_bot_quotas.json"  # Contadores das cotas de geração
+STATS_FILE = "gen_bot_stats.json"    # Agregados de uso por categoria
+STATE_FILE = "gen_bot_state.json"    # Estado salvo no desligamento para o próximo início
 CONFIG_FILE = "gen_bot_config.json"  # Arquivo de configuração
+THEME_FILE = "gen_bot_theme.json"    # Cores e ícones personalizados (opcional)
 LOG_FILE = "gen_bot_log.txt"         # Arquivo de log
+AUDIT_DB = "gen_bot_audit.db"        # Eventos de auditoria indexados por usuário, categoria e data
+BACKUP_DIR = "backups"               # Pasta dos backups compactados do estoque
+HEALTH_HOST = os.getenv("HEALTH_HOST", "127.0.0.1")  # Endereço do endpoint de saúde
+HEALTH_PORT = int(os.getenv("HEALTH_PORT", "8080"))  # Porta do endpoint de saúde (0 desativa)
 
 # --- Configuração do Bot ---
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True  # Necessário para enviar DMs
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+class GenBot(commands.Bot):
+    """Bot que passa cada comando pelo controle de admissão antes de executá-lo."""
+    
+    async def invoke(self, ctx):
+        if ctx.command is None:
+            return await super().invoke(ctx)
+        
+        name = ctx.command.name
+        if not admission.try_enter(name):
+            await admission.reject(ctx)
+            return
+        try:
+            await super().invoke(ctx)
+        finally:
+            admission.leave(name)
+
+# O status vai junto com o IDENTIFY, sem chamada extra no on_ready
+bot = GenBot(
+    command_prefix="!",
+    intents=intents,
+    activity=discord.Activity(
+        type=discord.ActivityType.watching,
+        name="!gen [categoria] para uma conta"
+    )
+)
+
+def freeze(value):
+    """Converte dicionários e listas em estruturas imutáveis (recursivamente)."""
+    if isinstance(value, (dict, types.MappingProxyType)):
+        return types.MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def thaw(value):
+    """Cria uma cópia editável (e serializável em JSON) de uma estrutura imutável."""
+    if isinstance(value, (dict, types.MappingProxyType)):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
 
 # Configuração padrão
-config = {
+DEFAULT_CONFIG = {
     "gen_channel_id": int(os.getenv("CHANNEL_ID", "0")),  # Carrega do .env
     "cooldown_minutes": 60,  # Tempo de espera entre gerações (em minutos)
     "admin_role_id": 0,      # ID do cargo de admin para adicionar contas
     "embed_color": 0x2F3136, # Cor padrão dos embeds (cinza escuro do Discord)
-    "accent_color": 0x5865F2 # Cor de destaque (azul Discord)
+    "accent_color": 0x5865F2, # Cor de destaque (azul Discord)
+    "loop_lag_threshold_ms": 250, # Atraso do event loop considerado bloqueio (em ms)
+    "max_concurrent_commands": 25, # Máximo de comandos em execução ao mesmo tempo
+    "command_limits": {           # Máximo de execuções simultâneas por comando
+        "gen": 5,
+        "stock": 2,
+        "remaining": 2,
+        "addacc": 1
+    },
+    "stock_coalesce_seconds": 10, # Janela em que !stock no mesmo canal reaproveita a última resposta
+    "waitlist_batch_size": 10,    # Usuários mencionados por mensagem de reabastecimento
+    "waitlist_batch_interval": 5, # Intervalo entre mensagens de reabastecimento (em segundos)
+    "dispense_policies": {},      # Modo de entrega por categoria (fifo, random ou weighted)
+    "shutdown_deadline_seconds": 20, # Tempo máximo para concluir o trabalho pendente ao desligar
+    "stock_board_message_id": 0,  # Mensagem fixa de estoque no canal de geração (0 = desativada)
+    "stock_board_interval": 15,   # Intervalo mínimo entre edições da mensagem de estoque (em segundos)
+    "backup_interval_hours": 0,   # Intervalo entre backups automáticos do estoque (0 = desativado)
+    "backup_keep": 7,             # Quantidade de backups mantidos na pasta
+    "import_batch_size": 5000,    # Contas gravadas por lote na importação de arquivo do !addacc
+    "memprofile_interval_minutes": 10, # Intervalo entre amostras do !memprofile quando ativo
+    "quotas": {                   # Cotas de geração por janela (0 = sem limite)
+        "default": {"hour": 0, "day": 0},  # Total por usuário
+        "roles": {},              # {"ID do cargo": {"hour": N, "day": M}} substitui o padrão
+        "categories": {}          # {"categoria": {"hour": N, "day": M}} por usuário na categoria
+    }
 }
 
-# Cores para embeds (pode ser personalizado)
-COLORS = {
+# Cores para embeds (pode ser personalizado em gen_bot_theme.json)
+DEFAULT_COLORS = {
     "success": 0x57F287,  # Verde
     "error": 0xED4245,    # Vermelho
     "warning": 0xFEE75C,  # Amarelo
@@ -51,7 +144,7 @@ COLORS = {
 }
 
 # Ícones para categorias específicas (emoji como identificador visual)
-CATEGORY_ICONS = {
+DEFAULT_CATEGORY_ICONS = {
     "valorant": "🎮",
     "netflix": "🎬",
     "hbo": "🍿",
@@ -71,6 +164,12 @@ CATEGORY_ICONS = {
     "default": "🔑"  # Ícone padrão para categorias não mapeadas
 }
 
+# Snapshots imutáveis em uso. São substituídos por inteiro a cada recarga, então
+# os comandos leem sem locks nem acesso a disco.
+config = freeze(DEFAULT_CONFIG)
+COLORS = freeze(DEFAULT_COLORS)
+CATEGORY_ICONS = freeze(DEFAULT_CATEGORY_ICONS)
+
 # Emojis para diferentes tipos de mensagens
 EMOJIS = {
     "success": "✅",
@@ -89,33 +188,189 @@ EMOJIS = {
 # Dicionário para controlar o cooldown dos usuários
 user_cooldowns = {}
 
+# Tarefas em segundo plano iniciadas pelo bot
+background_tasks = set()
+
+# Tarefas que devem terminar antes do desligamento (ex.: avisos da fila de espera)
+drain_tasks = set()
+
+# Exclusões agendadas: ID da mensagem -> (ID do canal, horário da exclusão)
+pending_deletes = {}
+
+# --- Monitor do Event Loop ---
+LOOP_LAG_INTERVAL = 0.5         # Intervalo entre medições de atraso (em segundos)
+LOOP_LAG_METRICS_INTERVAL = 60  # Intervalo entre exportações das métricas (em segundos)
+
+# Últimas medições de atraso (~10 minutos com o intervalo padrão)
+loop_lag_samples = collections.deque(maxlen=1200)
+
+# Contagem de bloqueios detectados por função responsável
+loop_block_sites = collections.Counter()
+
 # --- Funções de Utilidade ---
-def load_config():
-    """Carrega a configuração do arquivo."""
+def read_json_file(path):
+    """Lê um arquivo JSON."""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def write_json_file(path, data, indent=None):
+    """Grava um arquivo JSON de forma atômica (arquivo temporário + os.replace)."""
+    # Temporário por thread: os salvamentos periódicos gravam fora do event loop
+    temp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(data, f, indent=indent)
+    os.replace(temp_path, path)
+
+def file_mtime(path):
+    """Retorna a data de modificação do arquivo, ou None se ele não existir."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def merge_config(default, value, key="config"):
+    """Combina um valor carregado com o padrão, mantendo o padrão se o tipo for inválido."""
+    if isinstance(default, dict):
+        if not isinstance(value, dict):
+            print(f"[ERRO] Valor inválido para {key}: {value!r}. Usando o padrão.")
+            return thaw(default)
+        merged = thaw(default)
+        for name, item in value.items():
+            merged[name] = merge_config(default[name], item, f"{key}.{name}") if name in default else item
+        return merged
+    if isinstance(default, int) and (not isinstance(value, int) or isinstance(value, bool)):
+        print(f"[ERRO] Valor inválido para {key}: {value!r}. Usando o padrão.")
+        return default
+    return value
+
+def is_count(value):
+    """Indica se o valor é um inteiro não negativo (bool não conta)."""
+    return isinstance(value, int) and not isinstance(value, bool) and value >= 0
+
+# Valor mínimo das chaves numéricas que não aceitam 0 (as demais aceitam qualquer inteiro >= 0)
+CONFIG_MINIMUMS = {
+    "loop_lag_threshold_ms": 1,
+    "max_concurrent_commands": 1,
+    "waitlist_batch_size": 1,
+    "waitlist_batch_interval": 1,
+    "stock_board_interval": 1,
+    "import_batch_size": 1,
+    "memprofile_interval_minutes": 1
+}
+
+def validate_config(candidate):
+    """Valida limites numéricos e chaves aninhadas; lança ValueError no primeiro problema."""
+    for key, default in DEFAULT_CONFIG.items():
+        if isinstance(default, int) and not isinstance(default, bool):
+            minimum = CONFIG_MINIMUMS.get(key, 0)
+            if not is_count(candidate[key]) or candidate[key] < minimum:
+                raise ValueError(f"{key}: {candidate[key]!r} deve ser um inteiro >= {minimum}")
+    
+    for command, limit in candidate["command_limits"].items():
+        if not is_count(limit):
+            raise ValueError(f"command_limits.{command}: {limit!r} não é um inteiro >= 0")
+    
+    quotas = candidate["quotas"]
+    quota_tables = [("quotas.default", quotas["default"])]
+    for group in ("roles", "categories"):
+        quota_tables += [(f"quotas.{group}.{name}", limits) for name, limits in quotas[group].items()]
+    for key, limits in quota_tables:
+        if not isinstance(limits, dict):
+            raise ValueError(f"{key}: {limits!r} não é um objeto")
+        for window, limit in limits.items():
+            if window not in QUOTA_WINDOWS or not is_count(limit):
+                raise ValueError(f"{key}.{window}: {limit!r} inválido (use hour/day com um inteiro >= 0)")
+    
+    for category, policy in candidate["dispense_policies"].items():
+        if policy not in DISPENSE_POLICIES:
+            raise ValueError(f"dispense_policies.{category}: {policy!r} não é um modo válido "
+                             f"({', '.join(DISPENSE_POLICIES)})")
+
+def apply_config(loaded_config):
+    """Substitui o snapshot de configuração pelo conteúdo carregado do arquivo.
+
+    Se a validação falhar, lança ValueError e o snapshot anterior continua valendo.
+    """
     global config
+    # Atualiza apenas as chaves existentes no config padrão
+    candidate = {
+        key: merge_config(default, loaded_config[key], key) if key in loaded_config else thaw(default)
+        for key, default in DEFAULT_CONFIG.items()
+    }
+    validate_config(candidate)
+    config = freeze(candidate)
+
+def parse_color(value):
+    """Converte uma cor do tema (inteiro, "#RRGGBB" ou "0xRRGGBB") em inteiro."""
+    if isinstance(value, int):
+        return value
+    return int(str(value).lstrip("#"), 16)
+
+def apply_theme(theme):
+    """Substitui os snapshots de cores e ícones pelos padrões combinados com o tema."""
+    global COLORS, CATEGORY_ICONS
+    colors = dict(DEFAULT_COLORS)
+    for name, value in theme.get("colors", {}).items():
+        colors[name.lower()] = parse_color(value)
+    icons = dict(DEFAULT_CATEGORY_ICONS)
+    icons.update({name.lower(): icon for name, icon in theme.get("icons", {}).items()})
+    COLORS, CATEGORY_ICONS = freeze(colors), freeze(icons)
+
+def load_config():
+    """Carrega a configuração e o tema dos arquivos."""
     try:
         if os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, 'r') as f:
-                loaded_config = json.load(f)
-                # Atualiza apenas as chaves existentes no config padrão
-                for key in config:
-                    if key in loaded_config:
-                        config[key] = loaded_config[key]
+            apply_config(read_json_file(CONFIG_FILE))
             print(f"[CONFIG] Configuração carregada: {CONFIG_FILE}")
         else:
-            save_config()
+            write_json_file(CONFIG_FILE, thaw(config), indent=4)
             print(f"[CONFIG] Arquivo de configuração não encontrado. Configuração padrão criada: {CONFIG_FILE}")
     except Exception as e:
         print(f"[ERRO] Erro ao carregar configuração: {e}")
-
-def save_config():
-    """Salva a configuração no arquivo."""
+    
     try:
-        with open(CONFIG_FILE, 'w') as f:
-            json.dump(config, f, indent=4)
-        print(f"[CONFIG] Configuração salva: {CONFIG_FILE}")
+        if os.path.exists(THEME_FILE):
+            apply_theme(read_json_file(THEME_FILE))
+            print(f"[CONFIG] Tema carregado: {THEME_FILE}")
     except Exception as e:
-        print(f"[ERRO] Erro ao salvar configuração: {e}")
+        print(f"[ERRO] Erro ao carregar tema: {e}")
+
+# Última modificação conhecida de cada arquivo observado
+watched_mtimes = {}
+config_write_lock = asyncio.Lock()
+
+async def save_config(new_config):
+    """Aplica a nova configuração na hora e a grava no arquivo em segundo plano."""
+    global config
+    config = freeze(new_config)
+    async with config_write_lock:
+        try:
+            # Grava sempre o snapshot mais recente
+            await asyncio.to_thread(write_json_file, CONFIG_FILE, thaw(config), 4)
+            watched_mtimes[CONFIG_FILE] = file_mtime(CONFIG_FILE)
+            print(f"[CONFIG] Configuração salva: {CONFIG_FILE}")
+        except Exception as e:
+            print(f"[ERRO] Erro ao salvar configuração: {e}")
+
+async def watch_config_files(interval=2):
+    """Recarrega a configuração e o tema quando os arquivos são editados no disco."""
+    watched = {CONFIG_FILE: apply_config, THEME_FILE: apply_theme}
+    for path in watched:
+        watched_mtimes[path] = file_mtime(path)
+    
+    while True:
+        await asyncio.sleep(interval)
+        for path, apply in watched.items():
+            mtime = file_mtime(path)
+            if mtime is None or mtime == watched_mtimes[path]:
+                continue
+            watched_mtimes[path] = mtime
+            try:
+                # Lê e valida fora do event loop; a troca do snapshot é atômica
+                apply(await asyncio.to_thread(read_json_file, path))
+                print(f"[CONFIG] {path} recarregado")
+            except Exception as e:
+                print(f"[ERRO] Erro ao recarregar {path}: {e}")
 
 def load_accounts():
     """Carrega as contas do arquivo JSON."""
@@ -142,8 +397,7 @@ def load_accounts():
 def save_accounts(accounts):
     """Salva as contas no arquivo JSON."""
     try:
-        with open(ACCOUNTS_FILE, 'w') as f:
-            json.dump(accounts, f, indent=4)
+        write_json_file(ACCOUNTS_FILE, accounts, indent=4)
         
         # Conta o total de contas
         total_accounts = sum(len(accs) for accs in accounts.values())
@@ -151,6 +405,879 @@ def save_accounts(accounts):
     except Exception as e:
         print(f"[ERRO] Erro ao salvar contas: {e}")
 
+# --- Snapshot Binário de Contas ---
+# Layout do arquivo (little-endian):
+#   cabeçalho: MAGIC (8 bytes) | número de categorias (u32) | id do snapshot (u64)
+#   índice:    por categoria -> tamanho do nome (u16) | nome (utf-8) | total de registros (u32)
+#              | head (u32, primeira conta ainda não entregue) | posição da tabela de offsets (u64)
+#   offsets:   por categoria -> um u64 por registro com a posição absoluta do registro
+#   registros: tamanho (u32) | conta (utf-8)
+SNAPSHOT_MAGIC = b"BCSNAP02"
+SNAPSHOT_HEADER = struct.Struct("<8sIQ")
+# Formato anterior, sem id (lido como id 0)
+SNAPSHOT_LEGACY_MAGIC = b"BCSNAP01"
+SNAPSHOT_LEGACY_HEADER = struct.Struct("<8sI")
+SNAPSHOT_NAME_LEN = struct.Struct("<H")
+SNAPSHOT_INDEX = struct.Struct("<IIQ")
+SNAPSHOT_OFFSET = struct.Struct("<Q")
+SNAPSHOT_RECORD_LEN = struct.Struct("<I")
+
+def new_snapshot_id():
+    """Gera o id aleatório (não nulo) que liga um snapshot ao seu diário."""
+    return int.from_bytes(os.urandom(8), "little") | 1
+
+def write_snapshot(path, categories, opener=open, snapshot_id=0):
+    """Grava um snapshot a partir de pares (categoria, registros em bytes).
+
+    Os registros podem ser qualquer coleção com len() que possa ser percorrida
+    mais de uma vez (listas ou CategoryArena). Com opener=gzip.open o snapshot
+    é gravado compactado, em fluxo. Snapshots com id 0 (backups) não aceitam diário.
+    """
+    categories = [(name.encode("utf-8"), records) for name, records in categories]
+    
+    # Calcula onde começam as tabelas de offsets e os registros
+    position = SNAPSHOT_HEADER.size
+    for name, records in categories:
+        position += SNAPSHOT_NAME_LEN.size + len(name) + SNAPSHOT_INDEX.size
+    offsets_positions = []
+    for name, records in categories:
+        offsets_positions.append(position)
+        position += SNAPSHOT_OFFSET.size * len(records)
+    
+    temp_path = f"{path}.tmp"
+    with opener(temp_path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(categories), snapshot_id))
+        for (name, records), offsets_position in zip(categories, offsets_positions):
+            f.write(SNAPSHOT_NAME_LEN.pack(len(name)))
+            f.write(name)
+            f.write(SNAPSHOT_INDEX.pack(len(records), 0, offsets_position))
+        
+        # Tabelas de offsets
+        for name, records in categories:
+            offsets = array("Q")
+            for record in records:
+                offsets.append(position)
+                position += SNAPSHOT_RECORD_LEN.size + len(record)
+            f.write(offsets.tobytes())
+        
+        # Registros com prefixo de tamanho
+        for name, records in categories:
+            for record in records:
+                f.write(SNAPSHOT_RECORD_LEN.pack(len(record)))
+                f.write(record)
+        f.flush()
+        os.fsync(f.fileno())
+    
+    # Substitui o snapshot anterior de forma atômica
+    os.replace(temp_path, path)
+
+class SnapshotCategory:
+    """Entrada do índice de uma categoria no snapshot."""
+    __slots__ = ("count", "head", "head_position", "offsets_position")
+    
+    def __init__(self, count, head, head_position, offsets_position):
+        self.count = count
+        self.head = head
+        self.head_position = head_position
+        self.offsets_position = offsets_position
+
+class AccountSnapshot:
+    """Snapshot binário mapeado em memória; apenas o índice é lido na abertura."""
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "r+b")
+        self.mm = mmap.mmap(self.file.fileno(), 0)
+        # Backups em andamento que ainda leem este mapeamento
+        self.pins = 0
+        self.categories = {}
+        
+        magic = self.mm[:len(SNAPSHOT_MAGIC)]
+        if magic == SNAPSHOT_MAGIC:
+            _, category_count, self.snapshot_id = SNAPSHOT_HEADER.unpack_from(self.mm, 0)
+            position = SNAPSHOT_HEADER.size
+        elif magic == SNAPSHOT_LEGACY_MAGIC:
+            _, category_count = SNAPSHOT_LEGACY_HEADER.unpack_from(self.mm, 0)
+            self.snapshot_id = 0
+            position = SNAPSHOT_LEGACY_HEADER.size
+        else:
+            self.close()
+            raise ValueError(f"{path} não é um snapshot de contas válido")
+        
+        # Lê apenas o índice; os registros ficam no arquivo mapeado
+        for _ in range(category_count):
+            (name_length,) = SNAPSHOT_NAME_LEN.unpack_from(self.mm, position)
+            position += SNAPSHOT_NAME_LEN.size
+            name = self.mm[position:position + name_length].decode("utf-8")
+            position += name_length
+            count, head, offsets_position = SNAPSHOT_INDEX.unpack_from(self.mm, position)
+            # O head fica logo após o total de registros
+            self.categories[name] = SnapshotCategory(count, head, position + 4, offsets_position)
+            position += SNAPSHOT_INDEX.size
+    
+    def offsets(self, category):
+        """Copia a tabela de offsets da categoria para um array compacto."""
+        entry = self.categories[category]
+        end = entry.offsets_position + entry.count * SNAPSHOT_OFFSET.size
+        offsets = array("Q")
+        offsets.frombytes(self.mm[entry.offsets_position:end])
+        return offsets
+    
+    def set_head(self, category, head):
+        """Atualiza o head da categoria diretamente no arquivo."""
+        entry = self.categories[category]
+        entry.head = head
+        struct.pack_into("<I", self.mm, entry.head_position, head)
+    
+    def set_offset(self, category, index, offset):
+        """Atualiza uma posição da tabela de offsets diretamente no arquivo."""
+        entry = self.categories[category]
+        SNAPSHOT_OFFSET.pack_into(self.mm, entry.offsets_position + index * SNAPSHOT_OFFSET.size, offset)
+    
+    def close(self):
+        """Fecha o mapeamento e o arquivo."""
+        self.mm.close()
+        self.file.close()
+
+# Marca offsets que apontam para o buffer de cauda da arena em vez do snapshot
+ARENA_TAIL_FLAG = 1 << 63
+
+class CategoryArena:
+    """Contas de uma categoria em buffer único, com array de offsets e ponteiro de head.
+
+    Os registros carregados do snapshot são lidos direto do arquivo mapeado e os
+    adicionados em memória vão para um buffer de cauda no mesmo formato. Retirar
+    uma conta apenas avança o head, sem realocar nem deslocar nada.
+    """
+    __slots__ = ("base", "tail", "head", "_offsets", "_size", "_loader")
+    
+    def __init__(self, base=None, size=0, head=0, loader=None):
+        self.base = base
+        self.tail = bytearray()
+        self.head = head
+        # A tabela de offsets só é copiada do snapshot no primeiro acesso
+        self._offsets = None if loader else array("Q")
+        self._size = size
+        self._loader = loader
+    
+    @property
+    def offsets(self):
+        if self._offsets is None:
+            self._offsets = self._loader()
+            self._loader = None
+        return self._offsets
+    
+    def __len__(self):
+        size = self._size if self._offsets is None else len(self._offsets)
+        return size - self.head
+    
+    def __iter__(self):
+        for index in range(self.head, len(self.offsets)):
+            yield self.record(index)
+    
+    def record(self, index):
+        """Retorna o registro bruto (bytes) na posição informada."""
+        offset = self.offsets[index]
+        buffer = self.base
+        if offset & ARENA_TAIL_FLAG:
+            buffer = self.tail
+            offset ^= ARENA_TAIL_FLAG
+        (length,) = SNAPSHOT_RECORD_LEN.unpack_from(buffer, offset)
+        start = offset + SNAPSHOT_RECORD_LEN.size
+        return bytes(buffer[start:start + length])
+    
+    def _store(self, record):
+        # Grava o registro na cauda e retorna o offset marcado
+        offset = len(self.tail)
+        self.tail += SNAPSHOT_RECORD_LEN.pack(len(record))
+        self.tail += record
+        return offset | ARENA_TAIL_FLAG
+    
+    def append(self, record):
+        """Adiciona um registro ao final da categoria."""
+        self.offsets.append(self._store(record))
+    
+    def pop(self):
+        """Retira o registro do head avançando o ponteiro."""
+        record = self.record(self.head)
+        self.head += 1
+        return record
+    
+    def take(self, index):
+        """Retira o registro na posição informada trocando-o com o head (O(1)).
+
+        A troca não preserva a ordem da fila: o registro do head passa a ocupar a
+        posição retirada.
+        """
+        offsets = self.offsets
+        offsets[index], offsets[self.head] = offsets[self.head], offsets[index]
+        return self.pop()
+    
+    def push_front(self, record):
+        """Devolve um registro ao início; retorna True se gravou dados novos."""
+        if self.head > 0 and self.record(self.head - 1) == record:
+            # Caso comum: o registro devolvido é o último entregue
+            self.head -= 1
+            return False
+        if self.head > 0:
+            # Reaproveita o slot já entregue, sem deslocar o array
+            self.head -= 1
+            self.offsets[self.head] = self._store(record)
+        else:
+            self.offsets.insert(0, self._store(record))
+        return True
+    
+    def copy(self):
+        """Retorna uma cópia das contas restantes que não muda com retiradas futuras.
+
+        Copia só a tabela de offsets e a cauda; os registros do snapshot continuam
+        compartilhados, pois nunca são alterados no lugar.
+        """
+        arena = CategoryArena(self.base)
+        arena.tail = bytearray(self.tail)
+        arena._offsets = self.offsets[self.head:]
+        return arena
+    
+    def memory_usage(self):
+        """Retorna os bytes alocados no heap pela arena (sem o arquivo mapeado)."""
+        offsets = 0 if self._offsets is None else self._offsets.buffer_info()[1] * self._offsets.itemsize
+        return sys.getsizeof(self) + offsets + sys.getsizeof(self.tail)
+    
+    def steady_memory_usage(self):
+        """Retorna os bytes da arena com a tabela de offsets já carregada (após a primeira retirada)."""
+        entries = self._size if self._offsets is None else len(self._offsets)
+        return sys.getsizeof(self) + entries * SNAPSHOT_OFFSET.size + sys.getsizeof(self.tail)
+
+class EntryIndex:
+    """Índice persistente de hashes das contas já cadastradas (em estoque ou entregues).
+
+    Tabela hash de endereçamento aberto sobre um array de u64: consulta e
+    inserção O(1), com no máximo 16 bytes por conta (fator de carga de 50%).
+    """
+    MAGIC = b"BCIDX001"
+    HEADER = struct.Struct("<8sQ")
+    
+    def __init__(self, path):
+        self.path = path
+        self.table = array("Q", bytes(8 * 1024))
+        self.size = 0
+    
+    @staticmethod
+    def key(category, record):
+        """Calcula o hash de 64 bits de uma conta dentro da categoria."""
+        digest = hashlib.blake2b(category.encode("utf-8") + b"\0" + record, digest_size=8).digest()
+        # 0 marca slot vazio na tabela
+        return int.from_bytes(digest, "little") or 1
+    
+    def _slot(self, key):
+        # Sondagem linear até achar a chave ou um slot vazio
+        table = self.table
+        mask = len(table) - 1
+        slot = key & mask
+        while table[slot] and table[slot] != key:
+            slot = (slot + 1) & mask
+        return slot
+    
+    def __contains__(self, key):
+        return self.table[self._slot(key)] == key
+    
+    def __len__(self):
+        return self.size
+    
+    def add(self, key):
+        """Registra a chave; retorna False se ela já estava no índice."""
+        slot = self._slot(key)
+        if self.table[slot] == key:
+            return False
+        self.table[slot] = key
+        self.size += 1
+        if self.size * 2 > len(self.table):
+            self._grow()
+        return True
+    
+    def _grow(self):
+        # Dobra a tabela e reinsere as chaves
+        old_table = self.table
+        self.table = array("Q", bytes(len(old_table) * 2 * 8))
+        for key in old_table:
+            if key:
+                self.table[self._slot(key)] = key
+    
+    def clear(self):
+        """Esvazia o índice."""
+        self.table = array("Q", bytes(8 * 1024))
+        self.size = 0
+    
+    def load(self):
+        """Carrega o índice do arquivo; retorna False se ele não existir ou for inválido."""
+        try:
+            with open(self.path, "rb") as f:
+                magic, size = self.HEADER.unpack(f.read(self.HEADER.size))
+                if magic != self.MAGIC:
+                    raise ValueError(f"{self.path} não é um índice de contas válido")
+                table = array("Q")
+                table.frombytes(f.read())
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            print(f"[ERRO] Erro ao carregar índice de contas: {e}")
+            return False
+        self.table, self.size = table, size
+        return True
+    
+    def save(self, state=None):
+        """Grava o índice no arquivo de forma atômica.
+
+        state é um par (tamanho, bytes da tabela) já copiado, para gravar em
+        outra thread enquanto o índice continua recebendo chaves.
+        """
+        size, table = state or (self.size, self.table.tobytes())
+        # Temporário por thread: a compactação grava o índice fora do event loop
+        temp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(self.HEADER.pack(self.MAGIC, size))
+            f.write(table)
+        os.replace(temp_path, self.path)
+
+# --- Diário de Alterações ---
+# Layout do arquivo (little-endian):
+#   cabeçalho: MAGIC (8 bytes) | id do snapshot ao qual o diário se aplica (u64)
+#   entradas:  operação (1 byte) | tamanho do nome (u16) | categoria (utf-8) | dados
+#     A (conta adicionada) e F (conta devolvida ao início): tamanho (u32) | conta
+#     H (novo head): head (u32)
+#     S (troca de posições na tabela de offsets): i (u32) | j (u32)
+JOURNAL_MAGIC = b"BCJRN001"
+JOURNAL_HEADER = struct.Struct("<8sQ")
+JOURNAL_ENTRY = struct.Struct("<cH")
+JOURNAL_U32 = struct.Struct("<I")
+JOURNAL_SWAP = struct.Struct("<II")
+JOURNAL_COMPACT_MIN_BYTES = 1024 * 1024  # Tamanho mínimo do diário para compactar
+
+def encode_journal_entry(op, category, args):
+    """Serializa uma operação do diário."""
+    name = category.encode("utf-8")
+    entry = JOURNAL_ENTRY.pack(op, len(name)) + name
+    if op in (b"A", b"F"):
+        (record,) = args
+        return entry + JOURNAL_U32.pack(len(record)) + record
+    if op == b"H":
+        return entry + JOURNAL_U32.pack(*args)
+    return entry + JOURNAL_SWAP.pack(*args)
+
+def read_journal_entries(data, position):
+    """Percorre as entradas do diário, produzindo (fim, operação, categoria, dados).
+
+    Para na primeira entrada incompleta (gravação interrompida no meio).
+    """
+    while position < len(data):
+        try:
+            op, name_length = JOURNAL_ENTRY.unpack_from(data, position)
+            cursor = position + JOURNAL_ENTRY.size
+            category = data[cursor:cursor + name_length].decode("utf-8")
+            cursor += name_length
+            if op in (b"A", b"F"):
+                (length,) = JOURNAL_U32.unpack_from(data, cursor)
+                cursor += JOURNAL_U32.size
+                if cursor + length > len(data):
+                    return
+                args = (bytes(data[cursor:cursor + length]),)
+                cursor += length
+            elif op == b"H":
+                args = JOURNAL_U32.unpack_from(data, cursor)
+                cursor += JOURNAL_U32.size
+            elif op == b"S":
+                args = JOURNAL_SWAP.unpack_from(data, cursor)
+                cursor += JOURNAL_SWAP.size
+            else:
+                return
+        except (struct.error, UnicodeDecodeError):
+            return
+        position = cursor
+        yield position, op, category, args
+
+def write_journal(path, snapshot_id, entries):
+    """Grava um diário novo com as entradas (op, categoria, dados) informadas."""
+    with open(path, "wb") as f:
+        f.write(JOURNAL_HEADER.pack(JOURNAL_MAGIC, snapshot_id))
+        f.write(b"".join(encode_journal_entry(*entry) for entry in entries))
+        f.flush()
+        os.fsync(f.fileno())
+
+# Modos de entrega de contas
+DISPENSE_POLICIES = {
+    "fifo": "Entrega sempre a conta mais antiga",
+    "random": "Entrega uma conta aleatória",
+    "weighted": "Entrega uma conta aleatória, com mais chance para as primeiras da fila"
+}
+
+def pick_dispense_index(policy, head, end):
+    """Escolhe a posição da próxima conta a ser entregue em [head, end)."""
+    if policy == "random":
+        return random.randrange(head, end)
+    if policy == "weighted":
+        # Peso pela posição na fila, não pela idade: densidade decrescente a partir
+        # do head. Como take() troca a conta sorteada com a do head, a conta do head
+        # vai para o meio da fila e perde a prioridade; sem idade por registro, o
+        # modo só aproxima "mais antigas primeiro" enquanto houver poucas trocas.
+        return min(end - 1, head + int((end - head) * (1 - random.random() ** 0.5)))
+    return head
+
+class Inventory:
+    """Estoque de contas: uma CategoryArena por categoria sobre o snapshot binário.
+
+    Retiradas de categorias sem alterações pendentes são gravadas direto no
+    arquivo mapeado. Contas novas, devoluções e as retiradas seguintes dessas
+    categorias vão para o diário (append-only), que é incorporado a um snapshot
+    novo pela compactação quando cresce demais.
+    """
+    
+    def __init__(self, path, index_path, journal_path):
+        self.path = path
+        self.snapshot = None
+        self.arenas = {}
+        self.index = EntryIndex(index_path)
+        self.journal_path = journal_path
+        self.journal = None
+        # Categorias com operações no diário: não gravam mais no arquivo mapeado
+        self.journaled = set()
+        # Durante a compactação: heads no corte e operações feitas desde então
+        self.compacting = None
+        self.compact_ops = []
+        self.compact_failed = False
+        self.journal_lock = asyncio.Lock()
+        # Durante a importação nenhuma compactação começa (o índice gravado por ela ficaria velho)
+        self.importing = False
+        # Incrementada a cada alteração do estoque (invalida caches de exibição)
+        self.version = 0
+    
+    def load(self):
+        """Abre o snapshot e reaplica o diário, importando o arquivo JSON na primeira execução."""
+        if not os.path.exists(self.path):
+            if os.path.exists(ACCOUNTS_FILE):
+                print(f"[ACCOUNTS] Snapshot não encontrado. Importando contas de {ACCOUNTS_FILE}")
+            self.replace(load_accounts())
+        else:
+            self._open()
+            indexed = self.index.load()
+            if self.snapshot.snapshot_id:
+                self._open_journal()
+            else:
+                # Formato antigo ou backup restaurado: ganha um id e um diário próprio
+                self.save()
+            if not indexed:
+                self.rebuild_index()
+        print(f"[ACCOUNTS] {self.total()} contas em {len(self.arenas)} categorias carregadas de {self.path}")
+        print(f"[ACCOUNTS] Índice de duplicatas: {len(self.index)} contas registradas")
+        self.report_memory()
+    
+    def rebuild_index(self):
+        """Reconstrói o índice de duplicatas a partir das contas em estoque."""
+        self.index.clear()
+        for name, arena in self.arenas.items():
+            for record in arena:
+                self.index.add(EntryIndex.key(name, record))
+        self.index.save()
+        print(f"[ACCOUNTS] Índice de duplicatas reconstruído a partir do estoque: {self.index.path}")
+    
+    def _open(self):
+        # Mapeia o snapshot atual e recria as arenas sobre ele
+        snapshot = AccountSnapshot(self.path)
+        arenas = {
+            name: CategoryArena(snapshot.mm, entry.count, entry.head, functools.partial(snapshot.offsets, name))
+            for name, entry in snapshot.categories.items()
+        }
+        previous = self.snapshot
+        self.snapshot, self.arenas = snapshot, arenas
+        # Um snapshot fixado por backup só é fechado quando o backup termina
+        if previous and not previous.pins:
+            previous.close()
+    
+    def cut(self):
+        """Captura um corte consistente do estoque sem pausar as retiradas.
+
+        Deve ser chamado no event loop (sem await no meio), o que garante que
+        nenhuma retirada acontece durante a captura. Retorna o snapshot fixado,
+        que deve ser liberado com release(), e as cópias das categorias.
+        """
+        snapshot = self.snapshot
+        snapshot.pins += 1
+        return snapshot, [(name, arena.copy()) for name, arena in self.arenas.items()]
+    
+    def release(self, snapshot):
+        """Libera um snapshot fixado por cut()."""
+        snapshot.pins -= 1
+        if not snapshot.pins and snapshot is not self.snapshot:
+            snapshot.close()
+    
+    def _open_journal(self):
+        # Reaplica o diário do snapshot atual e o abre para novas operações
+        snapshot_id = self.snapshot.snapshot_id
+        data = b""
+        # Uma compactação interrompida depois de trocar o snapshot deixa o diário novo em .tmp
+        for path in (self.journal_path, f"{self.journal_path}.tmp"):
+            try:
+                with open(path, "rb") as f:
+                    contents = f.read()
+            except FileNotFoundError:
+                continue
+            if contents[:JOURNAL_HEADER.size] == JOURNAL_HEADER.pack(JOURNAL_MAGIC, snapshot_id):
+                if path != self.journal_path:
+                    os.replace(path, self.journal_path)
+                data = contents
+                break
+        
+        if not data:
+            if os.path.exists(self.journal_path):
+                print(f"[ACCOUNTS] Diário de outro snapshot descartado: {self.journal_path}")
+            write_journal(self.journal_path, snapshot_id, ())
+            self.journal = open(self.journal_path, "ab")
+            return
+        
+        end, replayed = JOURNAL_HEADER.size, 0
+        for end, op, category, args in read_journal_entries(data, JOURNAL_HEADER.size):
+            self._apply(op, category, args)
+            replayed += 1
+        if end < len(data):
+            print(f"[ACCOUNTS] Diário truncado em {end} bytes (gravação interrompida)")
+        self.journal = open(self.journal_path, "ab")
+        self.journal.truncate(end)
+        print(f"[ACCOUNTS] {replayed} operações do diário reaplicadas")
+    
+    def _apply(self, op, category, args):
+        # Reaplica uma operação do diário nas arenas em memória
+        arena = self.arenas.setdefault(category, CategoryArena())
+        if op == b"A":
+            arena.append(args[0])
+            self.index.add(EntryIndex.key(category, args[0]))
+        elif op == b"F":
+            arena.push_front(args[0])
+        elif op == b"H":
+            arena.head = args[0]
+        else:
+            i, j = args
+            offsets = arena.offsets
+            offsets[i], offsets[j] = offsets[j], offsets[i]
+        self.journaled.add(category)
+    
+    def _journaled(self, category):
+        # Indica se as operações da categoria vão para o diário em vez do arquivo mapeado
+        return (self.compacting is not None or category in self.journaled
+                or category not in self.snapshot.categories)
+    
+    def _log(self, *entries):
+        # Acrescenta operações (op, categoria, dados) ao diário; commit() faz o fsync
+        self.journal.write(b"".join(encode_journal_entry(*entry) for entry in entries))
+        self.journal.flush()
+        for op, category, args in entries:
+            self.journaled.add(category)
+            if self.compacting is not None:
+                self.compact_ops.append((op, category, args))
+                # Uma devolução para antes do corte não tem posição equivalente no snapshot novo
+                if self.arenas[category].head < self.compacting.get(category, 0):
+                    self.compact_failed = True
+        
+        # Compacta quando o diário passa da metade do snapshot: custo amortizado O(1) por operação
+        if self.compacting is None and not self.importing and self.journal.tell() > max(JOURNAL_COMPACT_MIN_BYTES, len(self.snapshot.mm) // 2):
+            spawn(self.compact(), drain=True)
+    
+    async def commit(self):
+        """Garante que o diário está no disco (fsync fora do event loop)."""
+        async with self.journal_lock:
+            await asyncio.to_thread(os.fsync, self.journal.fileno())
+    
+    async def compact(self):
+        """Incorpora o diário a um snapshot novo sem bloquear o event loop.
+
+        O snapshot é gravado em uma thread a partir de um corte; as operações
+        feitas durante a gravação são traduzidas para as posições do snapshot
+        novo e formam o diário seguinte.
+        """
+        if self.compacting is not None:
+            return
+        started = time.perf_counter()
+        snapshot, categories = self.cut()
+        self.compacting = {name: arena.head for name, arena in self.arenas.items()}
+        self.compact_ops, self.compact_failed = [], False
+        snapshot_id = new_snapshot_id()
+        compact_path = f"{self.path}.compact"
+        index_state = (self.index.size, self.index.table.tobytes())
+        
+        def write_compaction():
+            write_snapshot(compact_path, categories, snapshot_id=snapshot_id)
+            self.index.save(index_state)
+        
+        try:
+            await asyncio.to_thread(write_compaction)
+            async with self.journal_lock:
+                if self.compact_failed:
+                    os.remove(compact_path)
+                    print("[ACCOUNTS] Compactação descartada: o estoque mudou de forma incompatível durante a gravação")
+                    return
+                self._finish_compaction(compact_path, snapshot_id)
+        finally:
+            self.compacting = None
+            self.compact_ops = []
+            self.release(snapshot)
+        print(f"[ACCOUNTS] Snapshot compactado em {(time.perf_counter() - started) * 1000:.0f} ms")
+    
+    def _finish_compaction(self, compact_path, snapshot_id):
+        # Troca para o snapshot compactado com as operações feitas durante a gravação
+        heads = self.compacting
+        entries = []
+        for op, category, args in self.compact_ops:
+            shift = heads.get(category, 0)
+            if op == b"H":
+                args = (args[0] - shift,)
+            elif op == b"S":
+                args = (args[0] - shift, args[1] - shift)
+            entries.append((op, category, args))
+        
+        # O diário novo é gravado antes da troca; se a troca for interrompida, o load o encontra em .tmp
+        temp_path = f"{self.journal_path}.tmp"
+        write_journal(temp_path, snapshot_id, entries)
+        os.replace(compact_path, self.path)
+        os.replace(temp_path, self.journal_path)
+        
+        self.journal.close()
+        self._open()
+        self.journaled = set()
+        for op, category, args in entries:
+            self._apply(op, category, args)
+        self.journal = open(self.journal_path, "ab")
+        self.version += 1
+    
+    def save(self):
+        """Grava o estoque em um novo snapshot, descartando as contas já entregues, e recomeça o diário."""
+        if self.compacting is not None:
+            # O estoque foi substituído: a compactação em andamento ficou obsoleta
+            self.compact_failed = True
+        snapshot_id = new_snapshot_id()
+        write_snapshot(self.path, list(self.arenas.items()), snapshot_id=snapshot_id)
+        self._restart_journal(snapshot_id)
+    
+    def _restart_journal(self, snapshot_id):
+        # Recomeça o diário vazio para o snapshot recém-gravado e o mapeia
+        temp_path = f"{self.journal_path}.tmp"
+        write_journal(temp_path, snapshot_id, ())
+        os.replace(temp_path, self.journal_path)
+        
+        if self.journal:
+            self.journal.close()
+        self._open()
+        self.journaled = set()
+        self.journal = open(self.journal_path, "ab")
+    
+    def replace(self, accounts):
+        """Substitui todo o estoque pelo dicionário {categoria: [contas]} informado."""
+        arenas = {}
+        for category, accs in accounts.items():
+            arena = arenas[category] = CategoryArena()
+            for account in accs:
+                record = account.encode("utf-8")
+                arena.append(record)
+                # Mantém o histórico do índice e registra as contas importadas
+                self.index.add(EntryIndex.key(category, record))
+        self.arenas = arenas
+        self.version += 1
+        self.save()
+        self.index.save()
+    
+    async def import_file(self, loader):
+        """Substitui o estoque pelo dicionário {categoria: [contas]} devolvido por loader().
+
+        A leitura, o índice e o snapshot novo são montados em uma thread; só a
+        troca acontece no event loop. Contas adicionadas ao estoque antigo
+        durante a importação são descartadas junto com ele.
+        """
+        self.importing = True
+        try:
+            # Espera a compactação em andamento: ela gravaria o índice antigo por cima do novo
+            while self.compacting is not None:
+                await asyncio.sleep(0.05)
+            snapshot_id = new_snapshot_id()
+            import_path = f"{self.path}.import"
+            index_size, index_table = self.index.size, self.index.table.tobytes()
+            
+            def write_import():
+                # Mantém o histórico do índice e registra as contas importadas
+                index = EntryIndex(self.index.path)
+                index.table = array("Q")
+                index.table.frombytes(index_table)
+                index.size = index_size
+                categories = []
+                for category, accs in loader().items():
+                    arena = CategoryArena()
+                    for account in accs:
+                        record = account.encode("utf-8")
+                        arena.append(record)
+                        index.add(EntryIndex.key(category, record))
+                    categories.append((category, arena))
+                write_snapshot(import_path, categories, snapshot_id=snapshot_id)
+                index.save()
+                return index
+            
+            index = await asyncio.to_thread(write_import)
+            async with self.journal_lock:
+                os.replace(import_path, self.path)
+                self.index = index
+                self._restart_journal(snapshot_id)
+                self.version += 1
+        finally:
+            self.importing = False
+    
+    def _persist_head(self, category):
+        # Atualiza o head no arquivo mapeado (categorias fora do diário)
+        self.snapshot.set_head(category, self.arenas[category].head)
+    
+    def categories(self):
+        """Retorna todas as categorias conhecidas, incluindo as vazias."""
+        return list(self.arenas)
+    
+    def available_categories(self):
+        """Retorna as categorias com contas disponíveis, em ordem alfabética."""
+        return sorted(cat for cat, arena in self.arenas.items() if len(arena))
+    
+    def count(self, category):
+        """Retorna quantas contas restam na categoria."""
+        arena = self.arenas.get(category)
+        return len(arena) if arena else 0
+    
+    def total(self):
+        """Retorna o total de contas disponíveis."""
+        return sum(len(arena) for arena in self.arenas.values())
+    
+    def claim(self, category):
+        """Retira a próxima conta da categoria conforme o modo de entrega, ou None se estiver vazia."""
+        if not self.count(category):
+            return None
+        arena = self.arenas[category]
+        policy = config["dispense_policies"].get(category, "fifo")
+        head = arena.head
+        index = pick_dispense_index(policy, head, head + len(arena))
+        
+        if index == head:
+            account = arena.pop().decode("utf-8")
+        else:
+            account = arena.take(index).decode("utf-8")
+        
+        if self._journaled(category):
+            entries = [(b"H", category, (arena.head,))]
+            if index != head:
+                entries.insert(0, (b"S", category, (head, index)))
+            self._log(*entries)
+        else:
+            if index != head:
+                self._persist_offsets(category, head, index)
+            self._persist_head(category)
+        self.version += 1
+        return account
+    
+    def _persist_offsets(self, category, *indexes):
+        # Replica no arquivo mapeado as posições trocadas da tabela de offsets
+        offsets = self.arenas[category].offsets
+        for index in indexes:
+            self.snapshot.set_offset(category, index, offsets[index])
+    
+    def unclaim(self, category, account):
+        """Devolve uma conta retirada para o início da categoria."""
+        arena = self.arenas.setdefault(category, CategoryArena())
+        record = account.encode("utf-8")
+        self.version += 1
+        if self._journaled(category):
+            arena.push_front(record)
+            self._log((b"F", category, (record,)))
+        elif arena.push_front(record):
+            # A conta foi gravada na cauda: a categoria passa a usar o diário
+            self._log((b"F", category, (record,)))
+        else:
+            self._persist_head(category)
+    
+    def add(self, category, accounts):
+        """Adiciona contas ao final da categoria, gravando só as novas no diário.
+
+        Contas já cadastradas (em estoque ou já entregues) e repetidas no próprio
+        lote são ignoradas. Retorna quantas contas foram adicionadas; commit()
+        garante que elas chegaram ao disco.
+        """
+        arena = self.arenas.setdefault(category, CategoryArena())
+        entries = []
+        for account in accounts:
+            record = account.encode("utf-8")
+            if self.index.add(EntryIndex.key(category, record)):
+                arena.append(record)
+                entries.append((b"A", category, (record,)))
+        
+        if not entries:
+            # Nada novo: não cria categoria vazia nem grava no diário
+            if not len(arena) and category not in self.snapshot.categories:
+                del self.arenas[category]
+            return 0
+        
+        self._log(*entries)
+        self.version += 1
+        return len(entries)
+    
+    def flush(self):
+        """Garante que as atualizações do arquivo mapeado e do diário estão no disco."""
+        if self.snapshot:
+            self.snapshot.mm.flush()
+        if self.journal:
+            os.fsync(self.journal.fileno())
+    
+    async def export_file(self):
+        """Exporta um corte do estoque para o arquivo JSON, decodificando e gravando fora do event loop.
+
+        Retorna o total de contas e de categorias exportadas.
+        """
+        snapshot, categories = self.cut()
+        
+        def write_export():
+            accounts = {name: [record.decode("utf-8") for record in arena] for name, arena in categories}
+            save_accounts(accounts)
+            return sum(len(accs) for accs in accounts.values()), len(accounts)
+        
+        try:
+            return await asyncio.to_thread(write_export)
+        finally:
+            self.release(snapshot)
+    
+    def memory_usage(self):
+        """Mede o custo em memória do estoque e estima o custo como listas de str."""
+        accounts = self.total()
+        heap = sys.getsizeof(self.arenas) + sum(arena.memory_usage() for arena in self.arenas.values())
+        # As tabelas de offsets só são copiadas no primeiro acesso: o custo em regime conta todas
+        steady_heap = sys.getsizeof(self.arenas) + sum(arena.steady_memory_usage() for arena in self.arenas.values())
+        index_bytes = self.index.table.buffer_info()[1] * self.index.table.itemsize
+        mapped = len(self.snapshot.mm) if self.snapshot else 0
+        
+        # Estimativa do formato antigo: um str por conta mais o ponteiro na lista
+        # (cada registro no arquivo custa 8 bytes de offset e 4 de tamanho)
+        records = sum(entry.count for entry in self.snapshot.categories.values()) if self.snapshot else 0
+        average_length = max(0, mapped // records - SNAPSHOT_OFFSET.size - SNAPSHOT_RECORD_LEN.size) if records else 0
+        list_estimate = accounts * (sys.getsizeof("x" * average_length) + 8)
+        
+        return {
+            "accounts": accounts,
+            "heap_bytes": heap,
+            "steady_heap_bytes": steady_heap,
+            "index_bytes": index_bytes,
+            "mapped_bytes": mapped,
+            "bytes_per_account": (steady_heap + index_bytes) / accounts if accounts else 0.0,
+            "list_bytes_per_account": list_estimate / accounts if accounts else 0.0
+        }
+    
+    def report_memory(self):
+        """Imprime o custo em memória por conta."""
+        usage = self.memory_usage()
+        print(f"[ACCOUNTS] Memória: {usage['heap_bytes'] / 1024:.1f} KB no heap agora "
+              f"({usage['steady_heap_bytes'] / 1024:.1f} KB com os offsets carregados), "
+              f"{usage['mapped_bytes'] / 1024:.1f} KB mapeados, "
+              f"{usage['index_bytes'] / 1024:.1f} KB de índice, "
+              f"{usage['bytes_per_account']:.1f} bytes/conta em regime (offsets + índice) "
+              f"(listas de str: ~{usage['list_bytes_per_account']:.1f} bytes/conta)")
+
+inventory = Inventory(SNAPSHOT_FILE, INDEX_FILE, JOURNAL_FILE)
+
 def get_category_icon(category):
     """Retorna o ícone associado à categoria."""
     return CATEGORY_ICONS.get(category.lower(), CATEGORY_ICONS["default"])
@@ -159,16 +1286,969 @@ def get_category_color(category):
     """Retorna a cor associada à categoria."""
     return COLORS.get(category.lower(), COLORS["info"])
 
-def log_action(user, action, details=""):
-    """Registra uma ação no arquivo de log."""
+def log_action(user, action, details="", user_id=None, category=None):
+    """Registra uma ação no arquivo de log e no banco de auditoria (sem bloquear o event loop)."""
+    audit_store.record(time.time(), user, action, details, user_id, category)
+
+# --- Auditoria ---
+class AuditStore:
+    """Eventos de auditoria em SQLite com índices por usuário, categoria e data.
+
+    As gravações vão para uma fila e são feitas em lote por uma thread própria,
+    que também mantém o arquivo de log em texto. As consultas usam paginação
+    por cursor (data, id), então o custo não cresce com o tamanho do histórico.
+    """
+    
+    def __init__(self, db_path, log_path):
+        self.db_path = db_path
+        self.log_path = log_path
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+    
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        return connection
+    
+    def start(self):
+        """Cria as tabelas e inicia a thread de gravação."""
+        with self._connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS audit (
+                    id INTEGER PRIMARY KEY,
+                    ts REAL NOT NULL,
+                    user_id INTEGER,
+                    user TEXT NOT NULL,
+                    action TEXT NOT NULL,
+                    category TEXT,
+                    details TEXT
+                );
+                CREATE INDEX IF NOT EXISTS audit_user ON audit (user_id, ts);
+                CREATE INDEX IF NOT EXISTS audit_category ON audit (category, ts);
+                CREATE INDEX IF NOT EXISTS audit_ts ON audit (ts);
+            """)
+        connection.close()
+        self.thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self.thread.start()
+    
+    def record(self, ts, user, action, details, user_id=None, category=None):
+        """Enfileira um evento para gravação."""
+        self.queue.put((ts, user_id, str(user), action, category, details))
+        if self.thread is None:
+            # Sem a thread (ex.: antes do início), grava na hora
+            self._write([self.queue.get()])
+    
+    def _run(self):
+        connection = self._connect()
+        while True:
+            events = [self.queue.get()]
+            # Agrupa o que já estiver na fila em uma única transação
+            while not self.queue.empty() and len(events) < 500:
+                events.append(self.queue.get())
+            stop = None in events
+            self._write([event for event in events if event is not None], connection)
+            if stop:
+                break
+        connection.close()
+    
+    def _write(self, events, connection=None):
+        if not events:
+            return
+        try:
+            with open(self.log_path, 'a') as f:
+                for ts, user_id, user, action, category, details in events:
+                    timestamp = datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+                    f.write(f"[{timestamp}] {user} - {action} - {details}\n")
+        except Exception as e:
+            print(f"[ERRO] Erro ao registrar log: {e}")
+        
+        own_connection = connection is None
+        try:
+            connection = connection or self._connect()
+            with connection:
+                connection.executemany(
+                    "INSERT INTO audit (ts, user_id, user, action, category, details) VALUES (?, ?, ?, ?, ?, ?)",
+                    events
+                )
+        except Exception as e:
+            print(f"[ERRO] Erro ao registrar auditoria: {e}")
+        finally:
+            if own_connection and connection:
+                connection.close()
+    
+    def close(self, timeout=5):
+        """Grava os eventos pendentes e encerra a thread."""
+        if self.thread:
+            self.queue.put(None)
+            self.thread.join(timeout)
+            self.thread = None
+    
+    def query(self, user_id=None, category=None, since=0.0, before=None, limit=10):
+        """Retorna até `limit` eventos mais recentes que `since`, anteriores ao cursor `before`.
+
+        Executado em thread (asyncio.to_thread); cada consulta usa a própria conexão.
+        """
+        column, value = ("user_id", user_id) if user_id is not None else ("category", category)
+        sql = f"SELECT id, ts, user, action, category, details FROM audit WHERE {column} = ? AND ts >= ?"
+        params = [value, since]
+        if before:
+            sql += " AND (ts, id) < (?, ?)"
+            params += list(before)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit)
+        
+        connection = sqlite3.connect(self.db_path)
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+audit_store = AuditStore(AUDIT_DB, LOG_FILE)
+
+def spawn(coro, drain=False):
+    """Inicia uma tarefa em segundo plano mantendo uma referência até ela terminar.
+
+    Com drain=True o desligamento aguarda a tarefa (até o prazo) antes de sair.
+    """
+    task = asyncio.get_running_loop().create_task(coro)
+    tasks = drain_tasks if drain else background_tasks
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    return task
+
+def schedule_delete(message, delay):
+    """Agenda a exclusão de uma mensagem; o agendamento sobrevive a reinícios."""
+    pending_deletes[message.id] = (message.channel.id, time.time() + delay)
+    spawn(delete_message_later(message.channel.id, message.id, delay))
+
+async def delete_message_later(channel_id, message_id, delay):
+    """Exclui a mensagem após o atraso, usando apenas os IDs (sem cache)."""
+    await asyncio.sleep(delay)
+    pending_deletes.pop(message_id, None)
+    try:
+        await bot.http.delete_message(channel_id, message_id)
+    except discord.HTTPException:
+        pass  # Mensagem já excluída ou sem permissão
+
+def loop_lag_percentiles():
+    """Retorna os percentis de atraso do event loop (em ms)."""
+    samples = sorted(loop_lag_samples)
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    
+    def percentile(p):
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index] * 1000
+    
+    return {
+        "p50": percentile(50),
+        "p95": percentile(95),
+        "p99": percentile(99),
+        "max": samples[-1] * 1000
+    }
+
+def find_blocking_site(frame):
+    """Encontra a função deste módulo mais interna na pilha bloqueada."""
+    stack = traceback.extract_stack(frame)
+    for entry in reversed(stack):
+        if entry.filename == __file__:
+            return f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})", stack
+    # Nenhuma função do bot na pilha: usa o frame mais interno
+    entry = stack[-1]
+    return f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})", stack
+
+class LoopLagWatchdog:
+    """Thread que detecta bloqueios do event loop e captura a pilha responsável."""
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self.loop_thread_id = None
+        self.last_beat = time.monotonic()
+        self.reported_beat = None
+        self.thread = None
+    
+    def start(self, loop_thread_id):
+        """Inicia a thread de vigilância para a thread do event loop."""
+        self.loop_thread_id = loop_thread_id
+        self.last_beat = time.monotonic()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="loop-lag-watchdog", daemon=True)
+            self.thread.start()
+    
+    def beat(self):
+        """Registra que o event loop está respondendo."""
+        self.last_beat = time.monotonic()
+    
+    def _run(self):
+        while True:
+            time.sleep(0.05)
+            beat = self.last_beat
+            threshold = config["loop_lag_threshold_ms"] / 1000
+            stalled = time.monotonic() - beat - self.interval
+            
+            # Reporta apenas uma vez por bloqueio
+            if stalled < threshold or self.reported_beat == beat:
+                continue
+            self.reported_beat = beat
+            
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None:
+                continue
+            site, stack = find_blocking_site(frame)
+            loop_block_sites[site.split(" ")[0]] += 1
+            print(f"[LOOP] Event loop bloqueado há {int(stalled * 1000)} ms em {site}")
+            print("".join(traceback.format_list(stack[-8:])).rstrip())
+
+loop_lag_watchdog = LoopLagWatchdog(LOOP_LAG_INTERVAL)
+
+async def monitor_loop_lag():
+    """Mede continuamente o atraso do event loop e exporta os percentis."""
+    loop = asyncio.get_running_loop()
+    loop_lag_watchdog.start(threading.get_ident())
+    last_export = loop.time()
+    
+    while True:
+        start = loop.time()
+        loop_lag_watchdog.beat()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        now = loop.time()
+        loop_lag_samples.append(max(0.0, now - start - LOOP_LAG_INTERVAL))
+        
+        # Exporta as métricas de atraso periodicamente
+        if now - last_export >= LOOP_LAG_METRICS_INTERVAL:
+            last_export = now
+            lag = loop_lag_percentiles()
+            print(f"[METRICS] loop_lag_ms p50={lag['p50']:.1f} p95={lag['p95']:.1f} "
+                  f"p99={lag['p99']:.1f} max={lag['max']:.1f}")
+            if loop_block_sites:
+                sites = ", ".join(f"{name}={count}" for name, count in loop_block_sites.most_common(5))
+                print(f"[METRICS] loop_block_sites {sites}")
+            print(f"[METRICS] commands in_flight={admission.in_flight} "
+                  f"shed={sum(admission.shed.values())} coalesced={admission.coalesced}")
+
+# --- Controle de Admissão ---
+class AdmissionController:
+    """Limita comandos simultâneos e descarta ou agrupa o excesso durante picos.
+
+    Comandos acima do limite global ou do limite do próprio comando são
+    descartados na hora em vez de enfileirados, mantendo a latência de quem foi
+    admitido limitada mesmo durante spam.
+    """
+    REJECT_NOTICE_SECONDS = 30  # Cada usuário recebe no máximo um aviso de descarte por janela
+    
+    def __init__(self):
+        self.accepting = True
+        self.in_flight = 0
+        self.running = collections.Counter()
+        self.shed = collections.Counter()
+        self.coalesced = 0
+        self.recent = {}
+        self.notified = {}  # ID do usuário -> último aviso de descarte (monotônico)
+    
+    def try_enter(self, command):
+        """Tenta admitir uma execução do comando; retorna False se ela deve ser descartada."""
+        if not self.accepting:
+            return False
+        limit = config["command_limits"].get(command)
+        if self.in_flight >= config["max_concurrent_commands"] or (limit and self.running[command] >= limit):
+            self.shed[command] += 1
+            return False
+        self.in_flight += 1
+        self.running[command] += 1
+        return True
+    
+    def leave(self, command):
+        """Libera a vaga de uma execução admitida."""
+        self.in_flight -= 1
+        self.running[command] -= 1
+    
+    async def drain(self, deadline):
+        """Aguarda os comandos em execução terminarem até o prazo (tempo do loop)."""
+        loop = asyncio.get_running_loop()
+        while self.in_flight and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        return self.in_flight == 0
+    
+    async def reject(self, ctx):
+        """Sinaliza o descarte com uma reação, no máximo uma vez por usuário por janela.
+
+        Durante um flood os demais descartes são silenciosos, sem nenhuma
+        chamada REST, para o excesso não virar uma fila de requisições.
+        """
+        now = time.monotonic()
+        last = self.notified.get(ctx.author.id)
+        if last is not None and now - last < self.REJECT_NOTICE_SECONDS:
+            return
+        self.notified[ctx.author.id] = now
+        
+        # Remove avisos expirados para manter a memória limitada
+        if len(self.notified) > 1000:
+            self.notified = {
+                user_id: t for user_id, t in self.notified.items()
+                if now - t < self.REJECT_NOTICE_SECONDS
+            }
+        try:
+            await ctx.message.add_reaction(EMOJIS["time"])
+        except discord.HTTPException:
+            pass
+    
+    def should_coalesce(self, key, window):
+        """Retorna True se já houve uma resposta para a chave dentro da janela."""
+        now = time.monotonic()
+        last = self.recent.get(key)
+        if last is not None and now - last < window:
+            self.coalesced += 1
+            return True
+        self.recent[key] = now
+        
+        # Remove chaves expiradas para manter a memória limitada
+        if len(self.recent) > 1000:
+            self.recent = {k: t for k, t in self.recent.items() if now - t < window}
+        return False
+
+admission = AdmissionController()
+
+# --- Cotas de Geração ---
+QUOTA_WINDOWS = {"hour": 3600, "day": 86400}  # Duração das janelas de cota (em segundos)
+QUOTA_WINDOW_NAMES = {"hour": "hora", "day": "dia"}
+QUOTA_EXACT_LIMIT = 10  # Cotas até este limite usam os horários exatos das gerações
+
+def resolve_quota_limits(member, category):
+    """Retorna as cotas aplicáveis como pares ((escopo, janela), limite)."""
+    quotas = config["quotas"]
+    
+    # Cota total do usuário: o cargo mais generoso substitui o padrão nas janelas que define
+    default_limits = quotas["default"]
+    user_limits = dict(default_limits)
+    role_limits = [quotas["roles"][str(role.id)] for role in member.roles if str(role.id) in quotas["roles"]]
+    if role_limits:
+        user_limits = {
+            # Janela não definida no cargo herda o padrão; 0 explícito (sem limite) é o mais generoso
+            window: max(
+                (limits[window] if window in limits else default_limits.get(window, 0) for limits in role_limits),
+                key=lambda limit: limit or float("inf")
+            )
+            for window in QUOTA_WINDOWS
+        }
+    
+    limits = [(("*", window), limit) for window, limit in user_limits.items() if limit]
+    category_limits = quotas["categories"].get(category, {})
+    limits += [((category, window), limit) for window, limit in category_limits.items() if limit]
+    return limits
+
+class QuotaTracker:
+    """Contadores de janela deslizante por usuário, escopo e janela.
+
+    Cada contador guarda [início da janela, contagem atual, contagem anterior,
+    últimos horários]. Limites grandes usam a aproximação que pondera a janela
+    anterior pelo tempo restante; limites até QUOTA_EXACT_LIMIT usam os
+    horários guardados, pois a aproximação chegaria a bloquear por até duas
+    janelas. Verificar e registrar é O(1), e contadores ociosos são removidos
+    para a memória acompanhar só os usuários ativos.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.counters = {}  # (ID do usuário, escopo, janela) -> [início, atual, anterior, horários]
+        self.dirty = False
+    
+    def _counter(self, key, now):
+        # Retorna o contador da chave já avançado para a janela atual
+        window = QUOTA_WINDOWS[key[2]]
+        counter = self.counters.get(key)
+        if counter is None:
+            counter = self.counters[key] = [now - now % window, 0, 0, []]
+        elapsed_windows = int((now - counter[0]) // window)
+        if elapsed_windows > 0:
+            counter[2] = counter[1] if elapsed_windows == 1 else 0
+            counter[1] = 0
+            counter[0] += elapsed_windows * window
+        return counter
+    
+    def estimate(self, key, now):
+        """Estima quantas gerações ocorreram na última janela deslizante."""
+        counter = self._counter(key, now)
+        window = QUOTA_WINDOWS[key[2]]
+        return counter[2] * (1 - (now - counter[0]) / window) + counter[1]
+    
+    def available_at(self, key, limit, now):
+        """Estima quando a cota volta a ficar disponível (timestamp)."""
+        start, current, previous, _ = self._counter(key, now)
+        window = QUOTA_WINDOWS[key[2]]
+        # Gerar é permitido quando a estimativa chega a limit - 1
+        target = limit - 1
+        if current <= target and previous:
+            return start + window * (1 - (target - current) / previous)
+        # Precisa esperar a próxima janela, quando a atual passa a ser a anterior
+        return start + window + window * (1 - target / max(current, 1))
+    
+    def recent(self, key, now):
+        """Retorna os horários das gerações dentro da janela (limites pequenos)."""
+        counter = self._counter(key, now)
+        cutoff = now - QUOTA_WINDOWS[key[2]]
+        return [timestamp for timestamp in counter[3] if timestamp > cutoff]
+    
+    def check(self, user_id, limits, now):
+        """Retorna None se todas as cotas permitem gerar, ou ((escopo, janela), limite, disponível_em)."""
+        for (scope, window), limit in limits:
+            key = (user_id, scope, window)
+            if limit <= QUOTA_EXACT_LIMIT:
+                # Janela deslizante exata: libera quando a geração mais antiga que excede sai da janela
+                recent = self.recent(key, now)
+                if len(recent) >= limit:
+                    return (scope, window), limit, recent[len(recent) - limit] + QUOTA_WINDOWS[window]
+            elif self.estimate(key, now) + 1 > limit:
+                return (scope, window), limit, self.available_at(key, limit, now)
+        return None
+    
+    def record(self, user_id, category, now, amount=1):
+        """Registra (ou desfaz, com amount=-1) uma geração em todas as janelas."""
+        for scope in ("*", category):
+            for window in QUOTA_WINDOWS:
+                counter = self._counter((user_id, scope, window), now)
+                counter[1] = max(0, counter[1] + amount)
+                timestamps = counter[3]
+                if amount > 0:
+                    timestamps.extend([now] * amount)
+                    del timestamps[:-QUOTA_EXACT_LIMIT]
+                else:
+                    del timestamps[max(0, len(timestamps) + amount):]
+        self.dirty = True
+    
+    def prune(self, now):
+        """Remove contadores que já não influenciam nenhuma janela."""
+        expired = [
+            key for key, counter in self.counters.items()
+            if now - counter[0] >= 2 * QUOTA_WINDOWS[key[2]]
+        ]
+        for key in expired:
+            del self.counters[key]
+        if expired:
+            self.dirty = True
+    
+    def load(self):
+        """Carrega os contadores do arquivo."""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self.counters = {
+                        # Contadores de versões anteriores não têm a lista de horários
+                        (user_id, scope, window): counter if len(counter) > 3 else counter + [[]]
+                        for user_id, scope, window, counter in json.load(f)
+                        if window in QUOTA_WINDOWS
+                    }
+                print(f"[QUOTAS] {len(self.counters)} contadores de cota carregados de {self.path}")
+        except Exception as e:
+            print(f"[ERRO] Erro ao carregar cotas: {e}")
+    
+    def state(self):
+        """Copia os contadores para gravar em outra thread com save(state)."""
+        return [[*key, counter[:3] + [list(counter[3])]] for key, counter in self.counters.items()]
+    
+    def save(self, state=None):
+        """Salva os contadores no arquivo de forma atômica.
+
+        state é uma cópia feita por state(); sem ela a cópia é feita agora e a
+        marcação de alterações pendentes é limpa.
+        """
+        try:
+            write_json_file(self.path, self.state() if state is None else state)
+            if state is None:
+                self.dirty = False
+            return True
+        except Exception as e:
+            print(f"[ERRO] Erro ao salvar cotas: {e}")
+            return False
+
+quota_tracker = QuotaTracker(QUOTAS_FILE)
+
+async def persist_counters(interval=300):
+    """Remove contadores expirados e salva cotas e estatísticas periodicamente."""
+    while True:
+        await asyncio.sleep(interval)
+        quota_tracker.prune(time.time())
+        # Copia no event loop e grava em uma thread; falhas voltam a marcar alterações pendentes
+        for store in (quota_tracker, usage_stats):
+            if store.dirty:
+                store.dirty = False
+                if not await asyncio.to_thread(store.save, store.state()):
+                    store.dirty = True
+
+# --- Estatísticas de Uso ---
+STATS_HOURS = 24  # Quantidade de janelas horárias mantidas
+
+class UsageStats:
+    """Gerações e adições por categoria em anéis de janelas horárias.
+
+    Cada evento incrementa o balde da hora atual e a soma móvel de 24 horas,
+    então as consultas custam O(categorias) sem ler o arquivo de log. As
+    gerações por usuário seguem os mesmos baldes, por categoria e no total
+    ("*"), para listar os maiores consumidores sem percorrer as cotas.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.hour = int(time.time() // 3600)
+        self.rings = {"gens": {}, "adds": {}}  # tipo -> categoria -> array de baldes horários
+        self.totals = {"gens": collections.Counter(), "adds": collections.Counter()}
+        self.consumers = {}  # balde horário -> escopo -> Counter de gerações por usuário
+        self.consumer_totals = {}  # escopo -> Counter das últimas 24 horas
+        self.dirty = False
+    
+    def _advance(self, now):
+        # Zera os baldes das horas que saíram da janela de 24 horas
+        hour = int(now // 3600)
+        if hour <= self.hour:
+            return
+        steps = min(hour - self.hour, STATS_HOURS)
+        for kind, rings in self.rings.items():
+            for category, ring in rings.items():
+                for step in range(1, steps + 1):
+                    slot = (self.hour + step) % STATS_HOURS
+                    self.totals[kind][category] -= ring[slot]
+                    ring[slot] = 0
+        for step in range(1, steps + 1):
+            for scope, counts in self.consumers.pop((self.hour + step) % STATS_HOURS, {}).items():
+                self._count_consumers(scope, counts, -1)
+        self.hour = hour
+    
+    def _count_consumers(self, scope, counts, sign):
+        # Soma (ou subtrai) um balde nos totais de 24 horas, descartando quem zerou
+        totals = self.consumer_totals.setdefault(scope, collections.Counter())
+        for user_id, count in counts.items():
+            left = totals[user_id] + sign * count
+            if left > 0:
+                totals[user_id] = left
+            else:
+                del totals[user_id]
+        if not totals:
+            del self.consumer_totals[scope]
+    
+    def _record(self, kind, category, amount, now):
+        self._advance(now)
+        ring = self.rings[kind].setdefault(category, array("I", bytes(4 * STATS_HOURS)))
+        slot = self.hour % STATS_HOURS
+        amount = max(amount, -ring[slot])
+        ring[slot] += amount
+        self.totals[kind][category] += amount
+        self.dirty = True
+    
+    def record_gen(self, category, now, amount=1, user_id=None):
+        """Registra (ou desfaz, com amount=-1) uma geração, atribuída ao usuário se informado."""
+        self._record("gens", category, amount, now)
+        if user_id is None:
+            return
+        bucket = self.consumers.setdefault(self.hour % STATS_HOURS, {})
+        for scope in ("*", category):
+            counts = bucket.setdefault(scope, collections.Counter())
+            change = max(amount, -counts[user_id])
+            if not change:
+                continue
+            counts[user_id] += change
+            self._count_consumers(scope, {user_id: change}, 1)
+            if not counts[user_id]:
+                del counts[user_id]
+    
+    def record_add(self, category, count, now):
+        """Registra contas adicionadas."""
+        self._record("adds", category, count, now)
+    
+    def last_hour(self, kind, category, now):
+        """Estima os eventos da última hora ponderando a hora anterior."""
+        self._advance(now)
+        ring = self.rings[kind].get(category)
+        if not ring:
+            return 0.0
+        elapsed = (now % 3600) / 3600
+        return ring[self.hour % STATS_HOURS] + ring[(self.hour - 1) % STATS_HOURS] * (1 - elapsed)
+    
+    def last_day(self, kind, category, now):
+        """Retorna os eventos das últimas 24 horas."""
+        self._advance(now)
+        return self.totals[kind][category]
+    
+    def hours_to_empty(self, category, stock, now):
+        """Estima em quantas horas a categoria esvazia no ritmo das últimas 24 horas."""
+        rate = self.last_day("gens", category, now) / STATS_HOURS
+        return stock / rate if rate else None
+    
+    def top_consumers(self, scope, now, count=5):
+        """Retorna os pares (usuário, gerações) de quem mais gerou nas últimas 24 horas no escopo."""
+        self._advance(now)
+        totals = self.consumer_totals.get(scope)
+        return totals.most_common(count) if totals else []
+    
+    def categories(self):
+        """Retorna as categorias com algum registro."""
+        return set(self.rings["gens"]) | set(self.rings["adds"])
+    
+    def load(self):
+        """Carrega os agregados do arquivo."""
+        try:
+            if os.path.exists(self.path):
+                data = read_json_file(self.path)
+                self.hour = data["hour"]
+                for kind in self.rings:
+                    self.rings[kind] = {cat: array("I", ring) for cat, ring in data[kind].items()}
+                    self.totals[kind] = collections.Counter({cat: sum(ring) for cat, ring in self.rings[kind].items()})
+                # Arquivos de versões anteriores não têm os consumidores
+                self.consumers = {
+                    int(slot): {
+                        scope: collections.Counter({int(user_id): count for user_id, count in counts.items()})
+                        for scope, counts in scopes.items()
+                    }
+                    for slot, scopes in data.get("consumers", {}).items()
+                }
+                self.consumer_totals = {}
+                for scopes in self.consumers.values():
+                    for scope, counts in scopes.items():
+                        self._count_consumers(scope, counts, 1)
+                self._advance(time.time())
+                print(f"[STATS] Estatísticas de {len(self.categories())} categorias carregadas de {self.path}")
+        except Exception as e:
+            print(f"[ERRO] Erro ao carregar estatísticas: {e}")
+    
+    def state(self):
+        """Copia os agregados para gravar em outra thread com save(state)."""
+        data = {"hour": self.hour}
+        for kind, rings in self.rings.items():
+            data[kind] = {cat: ring.tolist() for cat, ring in rings.items()}
+        data["consumers"] = {
+            slot: {scope: dict(counts) for scope, counts in scopes.items()}
+            for slot, scopes in self.consumers.items()
+        }
+        return data
+    
+    def save(self, state=None):
+        """Salva os agregados no arquivo.
+
+        state é uma cópia feita por state(); sem ela a cópia é feita agora e a
+        marcação de alterações pendentes é limpa.
+        """
+        try:
+            write_json_file(self.path, self.state() if state is None else state)
+            if state is None:
+                self.dirty = False
+            return True
+        except Exception as e:
+            print(f"[ERRO] Erro ao salvar estatísticas: {e}")
+            return False
+
+usage_stats = UsageStats(STATS_FILE)
+
+def format_hours(hours):
+    """Formata uma duração em horas para exibição (ex.: 2d 5h)."""
+    if hours is None:
+        return "∞"
+    if hours < 1:
+        return f"{max(1, int(hours * 60))}min"
+    if hours < 48:
+        return f"{int(hours)}h"
+    return f"{int(hours // 24)}d {int(hours % 24)}h"
+
+# --- Fila de Espera por Reabastecimento ---
+class Waitlist:
+    """Filas de espera por categoria, com os IDs dos usuários em arrays compactos."""
+    
+    def __init__(self, path):
+        self.path = path
+        self.queues = {}
+        # Serializa as gravações feitas fora do event loop (a última cópia sempre grava por último)
+        self.lock = asyncio.Lock()
+    
+    def load(self):
+        """Carrega as filas do arquivo."""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self.queues = {cat: array("Q", ids) for cat, ids in json.load(f).items()}
+                waiting = sum(len(queue) for queue in self.queues.values())
+                print(f"[WAITLIST] {waiting} usuários aguardando em {len(self.queues)} categorias")
+        except Exception as e:
+            print(f"[ERRO] Erro ao carregar fila de espera: {e}")
+    
+    def state(self):
+        """Copia as filas para gravar em outra thread com save(state)."""
+        return {cat: queue.tolist() for cat, queue in self.queues.items() if queue}
+    
+    def save(self, state=None):
+        """Salva as filas no arquivo de forma atômica."""
+        try:
+            write_json_file(self.path, self.state() if state is None else state)
+        except Exception as e:
+            print(f"[ERRO] Erro ao salvar fila de espera: {e}")
+    
+    async def persist(self):
+        """Salva as filas em uma thread, a partir de uma cópia feita no event loop."""
+        async with self.lock:
+            await asyncio.to_thread(self.save, self.state())
+    
+    def join(self, category, user_id):
+        """Coloca o usuário na fila; retorna (posição, entrou_agora)."""
+        queue = self.queues.setdefault(category, array("Q"))
+        if user_id in queue:
+            return queue.index(user_id) + 1, False
+        queue.append(user_id)
+        return len(queue), True
+    
+    def size(self, category):
+        """Retorna quantos usuários aguardam a categoria."""
+        return len(self.queues.get(category, ()))
+    
+    def pop(self, category, count):
+        """Retira até `count` usuários do início da fila, em ordem de chegada."""
+        queue = self.queues.get(category)
+        if not queue:
+            return []
+        user_ids = queue[:count].tolist()
+        del queue[:count]
+        if not queue:
+            del self.queues[category]
+        return user_ids
+    
+    def requeue(self, category, user_ids):
+        """Devolve usuários não avisados ao início da fila, mantendo a ordem."""
+        queue = self.queues.setdefault(category, array("Q"))
+        queue[0:0] = array("Q", user_ids)
+
+waitlist = Waitlist(WAITLIST_FILE)
+
+async def notify_waitlist(category, available):
+    """Avisa os primeiros da fila, em lotes com intervalo, que a categoria foi reabastecida."""
+    channel = bot.get_channel(config["gen_channel_id"])
+    if not channel:
+        return
+    
+    # Avisa apenas tantos usuários quanto contas disponíveis, na ordem da fila
+    user_ids = waitlist.pop(category, available)
+    if not user_ids:
+        return
+    # Em segundo plano: um cancelamento aqui perderia os usuários já retirados da fila
+    spawn(waitlist.persist(), drain=True)
+    
+    batch_size = config["waitlist_batch_size"]
+    for start in range(0, len(user_ids), batch_size):
+        if start:
+            try:
+                await asyncio.sleep(config["waitlist_batch_interval"])
+            except asyncio.CancelledError:
+                # Desligamento: quem ainda não foi avisado volta para a fila
+                waitlist.requeue(category, user_ids[start:])
+                waitlist.save()
+                raise
+        mentions = " ".join(f"<@{user_id}>" for user_id in user_ids[start:start + batch_size])
+        embed = create_embed(
+            title=f"{get_category_icon(category)} Contas {format_category_name(category)} Disponíveis",
+            description=f"A categoria que você aguardava foi reabastecida! Use `!gen {category}`.",
+            color_name=category
+        )
+        try:
+            notice = await channel.send(
+                content=mentions,
+                embed=embed,
+                allowed_mentions=discord.AllowedMentions(users=True)
+            )
+            schedule_delete(notice, 60)
+        except discord.HTTPException as e:
+            print(f"[ERRO] Erro ao avisar fila de espera de {category}: {e}")
+
+# --- Inicialização e Prontidão ---
+# Subsistemas reportados pelo endpoint de saúde (o gateway é consultado no bot)
+readiness = {"config": False, "inventory": False, "waitlist": False,
+             "quotas": False, "stats": False, "state": False}
+startup_timings = {}  # Fase -> duração em ms
+startup_started = time.perf_counter()
+startup_preload = None  # Tarefa do pré-carregamento, aguardada no setup_hook
+
+def mark_phase(name, started):
+    """Registra a duração de uma fase da inicialização."""
+    startup_timings[name] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"[STARTUP] {name}: {startup_timings[name]:.1f} ms")
+
+async def preload(name, loader):
+    """Executa um carregamento de disco fora do event loop e marca o subsistema como pronto."""
+    started = time.perf_counter()
+    await asyncio.to_thread(loader)
+    mark_phase(name, started)
+    readiness[name] = True
+
+async def preload_all():
+    """Carrega configuração, estoque e estado em paralelo com o login no gateway."""
+    # A configuração vem primeiro: é pequena e o restante pode depender dela
+    await preload("config", load_config)
+    await asyncio.gather(
+        preload("inventory", inventory.load),
+        preload("waitlist", waitlist.load),
+        preload("quotas", quota_tracker.load),
+        preload("stats", usage_stats.load),
+        preload("state", load_restart_state)
+    )
+
+def health_status():
+    """Monta o relatório de prontidão de cada subsistema."""
+    subsystems = dict(readiness)
+    subsystems["gateway"] = bot.is_ready() and not bot.is_closed()
+    subsystems["accepting"] = admission.accepting
+    return {
+        "ready": all(subsystems.values()),
+        "subsystems": subsystems,
+        "uptime_seconds": round(time.perf_counter() - startup_started, 1),
+        "startup_ms": startup_timings,
+        "loop_lag_ms": {name: round(value, 1) for name, value in loop_lag_percentiles().items()},
+        "commands_in_flight": admission.in_flight
+    }
+
+async def handle_health(reader, writer):
+    """Responde GET /health (vivo) e GET /ready (200 apenas quando tudo está pronto)."""
     try:
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"[{timestamp}] {user} - {action} - {details}\n"
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        # Descarta os cabeçalhos
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass
+        
+        parts = request_line.decode("latin-1").split()
+        path = parts[1] if len(parts) > 1 else "/"
+        report = health_status()
+        if path == "/health":
+            code = "200 OK"
+        elif path == "/ready":
+            code = "200 OK" if report["ready"] else "503 Service Unavailable"
+        else:
+            code, report = "404 Not Found", {"error": "use /health ou /ready"}
         
-        with open(LOG_FILE, 'a') as f:
-            f.write(log_entry)
+        body = json.dumps(report).encode()
+        writer.write(
+            f"HTTP/1.1 {code}\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def start_health_server():
+    """Abre o endpoint local de saúde/prontidão."""
+    if not HEALTH_PORT:
+        return None
+    try:
+        server = await asyncio.start_server(handle_health, HEALTH_HOST, HEALTH_PORT)
+    except OSError as e:
+        print(f"[ERRO] Endpoint de saúde indisponível em {HEALTH_HOST}:{HEALTH_PORT}: {e}")
+        return None
+    print(f"[STARTUP] Endpoint de saúde em http://{HEALTH_HOST}:{HEALTH_PORT}/ready")
+    return server
+
+# --- Desligamento e Reinício ---
+def save_restart_state():
+    """Grava o estado em memória que não tem arquivo próprio (cooldowns e exclusões)."""
+    now = datetime.datetime.now()
+    cooldown_seconds = config["cooldown_minutes"] * 60
+    state = {
+        "saved_at": time.time(),
+        # Apenas cooldowns ainda ativos
+        "cooldowns": {
+            user_id: last_gen_time.timestamp()
+            for user_id, last_gen_time in user_cooldowns.items()
+            if (now - last_gen_time).total_seconds() < cooldown_seconds
+        },
+        "pending_deletes": [
+            [message_id, channel_id, due]
+            for message_id, (channel_id, due) in pending_deletes.items()
+        ]
+    }
+    write_json_file(STATE_FILE, state)
+    print(f"[STATE] Estado salvo: {len(state['cooldowns'])} cooldowns, "
+          f"{len(state['pending_deletes'])} exclusões pendentes")
+
+def load_restart_state():
+    """Restaura o estado salvo no último desligamento e descarta o arquivo."""
+    try:
+        if not os.path.exists(STATE_FILE):
+            return
+        state = read_json_file(STATE_FILE)
+        os.remove(STATE_FILE)
     except Exception as e:
-        print(f"[ERRO] Erro ao registrar log: {e}")
+        print(f"[ERRO] Erro ao carregar estado salvo: {e}")
+        return
+    
+    for user_id, timestamp in state.get("cooldowns", {}).items():
+        user_cooldowns[user_id] = datetime.datetime.fromtimestamp(timestamp)
+    for message_id, channel_id, due in state.get("pending_deletes", []):
+        pending_deletes[message_id] = (channel_id, due)
+    print(f"[STATE] Estado restaurado: {len(user_cooldowns)} cooldowns, "
+          f"{len(pending_deletes)} exclusões pendentes")
+
+def resume_pending_deletes():
+    """Reagenda as exclusões restauradas do último desligamento."""
+    now = time.time()
+    for message_id, (channel_id, due) in list(pending_deletes.items()):
+        spawn(delete_message_later(channel_id, message_id, max(0, due - now)))
+
+async def shutdown(reason):
+    """Para de aceitar comandos, conclui o trabalho pendente e salva o estado."""
+    if not admission.accepting:
+        return
+    admission.accepting = False
+    print(f"[SHUTDOWN] {reason}: parando de aceitar comandos")
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config["shutdown_deadline_seconds"]
+    
+    # Aguarda comandos em execução (DMs, respostas) e tarefas drenáveis
+    if not await admission.drain(deadline):
+        print(f"[SHUTDOWN] Prazo esgotado com {admission.in_flight} comandos em execução")
+    if drain_tasks:
+        done, pending = await asyncio.wait(set(drain_tasks), timeout=max(0, deadline - loop.time()))
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+    
+    # Grava tudo que ficaria perdido; subsistemas ainda não carregados (sinal durante o
+    # boot) ficam como estão no disco, em vez de serem sobrescritos com estruturas vazias
+    savers = [
+        ("inventory", inventory.flush),
+        ("waitlist", waitlist.save),
+        ("quotas", quota_tracker.save),
+        ("stats", usage_stats.save),
+        ("state", save_restart_state)
+    ]
+    for name, save in savers:
+        if readiness[name]:
+            save()
+        else:
+            print(f"[SHUTDOWN] {name} não foi carregado; arquivo mantido sem alterações")
+    await asyncio.to_thread(audit_store.close)
+    
+    print("[SHUTDOWN] Encerrando conexão")
+    await bot.close()
+
+async def run_bot(token):
+    """Executa o bot tratando SIGTERM/SIGINT com desligamento gracioso."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, lambda sig=sig: spawn(shutdown(signal.Signals(sig).name)))
+        except NotImplementedError:
+            pass  # Windows não suporta add_signal_handler
+    
+    global startup_preload
+    health_server = await start_health_server()
+    
+    # Os carregamentos de disco rodam enquanto o login é feito
+    startup_preload = spawn(preload_all())
+    try:
+        async with bot:
+            started = time.perf_counter()
+            await bot.login(token)
+            mark_phase("login", started)
+            
+            bot.connect_started = time.perf_counter()
+            await bot.connect()
+    finally:
+        if health_server:
+            health_server.close()
 
 def create_embed(title, description, color_name="info", thumbnail=None, footer=None, image=None, fields=None):
     """Cria um embed estilizado para o Discord."""
@@ -212,11 +2292,579 @@ def format_category_name(category):
     # Primeira letra maiúscula, resto minúsculo
     return category.lower().capitalize()
 
+def is_bot_admin(ctx):
+    """Verifica se o autor é admin, dono do servidor ou possui o cargo admin do bot."""
+    if ctx.author.guild_permissions.administrator or ctx.author.id == ctx.guild.owner_id:
+        return True
+    if config["admin_role_id"] != 0:
+        role = ctx.guild.get_role(config["admin_role_id"])
+        if role and role in ctx.author.roles:
+            return True
+    return False
+
+async def deny_permission(ctx):
+    """Responde que o autor não tem permissão para usar o comando."""
+    error_embed = create_embed(
+        title="Permissão Negada",
+        description="Você não tem permissão para usar este comando.",
+        color_name="error"
+    )
+    error_msg = await ctx.send(embed=error_embed)
+    schedule_delete(ctx.message, 5)
+    schedule_delete(error_msg, 5)
+
+# --- Visualização Paginada do Estoque ---
+STOCK_PAGE_SIZE = 12  # Categorias por página (o Discord aceita até 25 campos por embed)
+
+class StockPages:
+    """Páginas do estoque renderizadas sob demanda e guardadas por versão do estoque."""
+    
+    def __init__(self):
+        self.version = None
+        self.config = None
+        self.categories = []
+        self.pages = {}
+    
+    def _sync(self):
+        # Descarta o cache quando o estoque ou a configuração mudam
+        if self.version != inventory.version or self.config is not config:
+            self.version = inventory.version
+            self.config = config
+            self.categories = inventory.available_categories()
+            self.pages = {}
+    
+    def page_count(self):
+        """Retorna o número de páginas do estoque atual."""
+        self._sync()
+        return max(1, -(-len(self.categories) // STOCK_PAGE_SIZE))
+    
+    def render(self, page):
+        """Retorna o embed da página, construindo-o apenas se ainda não estiver em cache."""
+        page = min(max(page, 0), self.page_count() - 1)
+        if page in self.pages:
+            return self.pages[page]
+        
+        total_accounts = inventory.total()
+        stock_embed = create_embed(
+            title="Estoque de Contas",
+            description=f"Temos um total de **{total_accounts}** contas disponíveis em **{len(self.categories)}** categorias.",
+            color_name="stock"
+        )
+        
+        # Adiciona campos apenas para as categorias desta página
+        start = page * STOCK_PAGE_SIZE
+        for category in self.categories[start:start + STOCK_PAGE_SIZE]:
+            stock_embed.add_field(
+                name=f"{get_category_icon(category)} {format_category_name(category)}",
+                value=f"**{inventory.count(category)}** contas disponíveis\n`!gen {category}`",
+                inline=True
+            )
+        
+        # Adiciona informações de cooldown
+        if config["cooldown_minutes"] > 0:
+            stock_embed.add_field(
+                name=f"{EMOJIS['time']} Tempo de Espera",
+                value=f"**{config['cooldown_minutes']}** minutos entre gerações",
+                inline=False
+            )
+        
+        # Se o bot tiver um avatar, usa como thumbnail
+        if bot.user.avatar:
+            stock_embed.set_thumbnail(url=bot.user.avatar.url)
+        
+        footer = f"{bot.user.name} • Atualizado"
+        if self.page_count() > 1:
+            footer += f" • Página {page + 1}/{self.page_count()}"
+        stock_embed.set_footer(text=footer)
+        
+        self.pages[page] = stock_embed
+        return stock_embed
+
+stock_pages = StockPages()
+
+class StockView(discord.ui.View):
+    """Botões de navegação entre as páginas do estoque."""
+    
+    def __init__(self, timeout=180):
+        super().__init__(timeout=timeout)
+        self.page = 0
+        self.message = None
+        self._update_buttons()
+    
+    def _update_buttons(self):
+        page_count = stock_pages.page_count()
+        self.page = min(self.page, page_count - 1)
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= page_count - 1
+    
+    async def _show(self, interaction, page):
+        self.page = page
+        self._update_buttons()
+        await interaction.response.edit_message(embed=stock_pages.render(self.page), view=self)
+    
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self._show(interaction, self.page - 1)
+    
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self._show(interaction, self.page + 1)
+    
+    async def on_timeout(self):
+        # Remove os botões quando a navegação expira
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+# --- Histórico de Auditoria ---
+HISTORY_PAGE_SIZE = 10  # Eventos por página do !history
+
+class HistoryView(discord.ui.View):
+    """Navegação por páginas do histórico, buscando cada página sob demanda."""
+    
+    def __init__(self, title, user_id=None, category=None, since=0.0, timeout=180):
+        super().__init__(timeout=timeout)
+        self.title = title
+        self.filters = {"user_id": user_id, "category": category, "since": since}
+        self.cursors = [None]  # Cursor (ts, id) do início de cada página já visitada
+        self.rows = []
+        self.message = None
+    
+    async def load(self, page):
+        """Busca a página informada (0 = mais recente) e atualiza os botões."""
+        rows = await asyncio.to_thread(
+            audit_store.query, before=self.cursors[page], limit=HISTORY_PAGE_SIZE + 1, **self.filters
+        )
+        self.rows = rows[:HISTORY_PAGE_SIZE]
+        if len(rows) > HISTORY_PAGE_SIZE and len(self.cursors) == page + 1:
+            last = self.rows[-1]
+            self.cursors.append((last[1], last[0]))
+        self.page = page
+        self.previous_page.disabled = page == 0
+        self.next_page.disabled = len(self.cursors) <= page + 1
+    
+    def embed(self):
+        """Monta o embed da página atual."""
+        lines = [
+            f"<t:{int(ts)}:f> **{action}** - {user}" + (f"\n  {details}" if details else "")
+            for _, ts, user, action, category, details in self.rows
+        ]
+        return create_embed(
+            title=self.title,
+            description="\n".join(lines) if lines else "Nenhum evento encontrado.",
+            color_name="stats",
+            footer=f"{bot.user.name} • Página {self.page + 1}"
+        )
+    
+    async def _show(self, interaction, page):
+        await self.load(page)
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+    
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self._show(interaction, self.page - 1)
+    
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self._show(interaction, self.page + 1)
+    
+    async def on_timeout(self):
+        # Remove os botões quando a navegação expira
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
+
+# --- Painel de Estoque ---
+STOCK_BOARD_MAX_EMBEDS = 10   # Limite de embeds por mensagem do Discord
+STOCK_BOARD_MAX_CHARS = 6000  # Limite de caracteres somando todos os embeds da mensagem
+
+def stock_board_notice(shown):
+    """Cria o aviso do painel quando nem todas as categorias cabem na mensagem."""
+    return create_embed(
+        title="Mais Categorias",
+        description=f"O painel mostra **{shown}** de **{len(stock_pages.categories)}** categorias. "
+                    f"Use `!stock` para navegar por todas.",
+        color_name="stock"
+    )
+
+def stock_board_embeds():
+    """Retorna (embeds, completo): as páginas que cabem no painel e se todas couberam.
+
+    As páginas são somadas pelo tamanho real até os limites do Discord; quando
+    o estoque não cabe, a última posição vira um aviso apontando para o `!stock`.
+    """
+    page_count = stock_pages.page_count()
+    pages, used = [], 0
+    for page in range(min(page_count, STOCK_BOARD_MAX_EMBEDS)):
+        embed = stock_pages.render(page)
+        if used + len(embed) > STOCK_BOARD_MAX_CHARS:
+            break
+        pages.append(embed)
+        used += len(embed)
+    if len(pages) == page_count:
+        return pages, True
+    
+    # Abre espaço para o aviso (com folga para o número de categorias mudar de dígitos)
+    reserve = len(stock_board_notice(len(stock_pages.categories))) + 8
+    while pages and (len(pages) >= STOCK_BOARD_MAX_EMBEDS or used + reserve > STOCK_BOARD_MAX_CHARS):
+        used -= len(pages.pop())
+    shown = min(len(pages) * STOCK_PAGE_SIZE, len(stock_pages.categories))
+    return pages + [stock_board_notice(shown)], False
+
+def stock_board_url():
+    """Retorna o link da mensagem do painel de estoque, ou None se estiver desativado."""
+    channel = bot.get_channel(config["gen_channel_id"])
+    if not config["stock_board_message_id"] or not channel:
+        return None
+    return f"https://discord.com/channels/{channel.guild.id}/{channel.id}/{config['stock_board_message_id']}"
+
+async def update_stock_board():
+    """Edita o painel de estoque quando o estoque muda, no máximo uma vez por intervalo.
+
+    Rajadas de gerações viram uma única edição: a primeira mudança após um
+    período ocioso é publicada em até 1 segundo e as seguintes aguardam o
+    intervalo configurado.
+    """
+    loop = asyncio.get_running_loop()
+    shown = None
+    last_edit = 0.0
+    
+    while True:
+        await asyncio.sleep(1)
+        message_id = config["stock_board_message_id"]
+        if not message_id:
+            shown = None
+            continue
+        
+        current = (message_id, inventory.version, config["cooldown_minutes"])
+        if current == shown or loop.time() - last_edit < config["stock_board_interval"]:
+            continue
+        
+        channel = bot.get_channel(config["gen_channel_id"])
+        if not channel:
+            continue
+        last_edit = loop.time()
+        try:
+            embeds, _ = stock_board_embeds()
+            await channel.get_partial_message(message_id).edit(embeds=embeds)
+            shown = current
+        except discord.NotFound:
+            # A mensagem foi apagada: desativa o painel (se ele não foi trocado nesse meio tempo)
+            if config["stock_board_message_id"] != message_id:
+                continue
+            print(f"[STOCK] Painel de estoque {message_id} não encontrado. Painel desativado.")
+            new_config = thaw(config)
+            new_config["stock_board_message_id"] = 0
+            await save_config(new_config)
+        except discord.HTTPException as e:
+            print(f"[ERRO] Erro ao atualizar painel de estoque: {e}")
+
+# --- Backup do Estoque ---
+backup_lock = asyncio.Lock()
+
+def prune_backups(keep):
+    """Remove os backups mais antigos, mantendo os `keep` mais recentes."""
+    backups = sorted(name for name in os.listdir(BACKUP_DIR) if name.endswith(".snap.gz"))
+    for name in backups[:-keep] if keep > 0 else []:
+        os.remove(os.path.join(BACKUP_DIR, name))
+
+async def backup_inventory():
+    """Grava um backup compactado e consistente do estoque enquanto os comandos continuam.
+
+    O corte (cópia das tabelas de offsets) é feito no event loop; a leitura dos
+    registros e a compactação rodam em uma thread a partir do snapshot fixado.
+    Retorna (caminho, contas, bytes, duração do corte em ms).
+    """
+    async with backup_lock:
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        path = os.path.join(BACKUP_DIR, f"accounts-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.snap.gz")
+        
+        started = time.perf_counter()
+        snapshot, categories = inventory.cut()
+        cut_ms = (time.perf_counter() - started) * 1000
+        try:
+            await asyncio.to_thread(write_snapshot, path, categories, gzip.open)
+        finally:
+            inventory.release(snapshot)
+        
+        await asyncio.to_thread(prune_backups, config["backup_keep"])
+        accounts = sum(len(records) for _, records in categories)
+        size = os.path.getsize(path)
+        print(f"[BACKUP] {accounts} contas salvas em {path} ({size / 1024:.1f} KB, corte em {cut_ms:.1f} ms)")
+        return path, accounts, size, cut_ms
+
+async def scheduled_backups():
+    """Faz backups automáticos no intervalo configurado."""
+    while True:
+        await asyncio.sleep(60)
+        hours = config["backup_interval_hours"]
+        if not hours:
+            continue
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        backups = sorted(name for name in os.listdir(BACKUP_DIR) if name.endswith(".snap.gz"))
+        last = os.path.getmtime(os.path.join(BACKUP_DIR, backups[-1])) if backups else 0
+        if time.time() - last >= hours * 3600:
+            try:
+                await backup_inventory()
+            except Exception as e:
+                print(f"[ERRO] Erro ao fazer backup automático: {e}")
+
+# --- Perfil de Memória ---
+MEMPROFILE_FRAMES = 10  # Profundidade da pilha guardada por alocação
+
+# Estado do perfil: tarefa de amostragem e últimos snapshots do tracemalloc
+memprofile = {"task": None, "last": None, "diff": []}
+
+def container_size(container):
+    """Estima o tamanho de um contêiner somando os itens de primeiro nível."""
+    size = sys.getsizeof(container)
+    if isinstance(container, dict):
+        items = container.items()
+        size += sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in items)
+    elif isinstance(container, (set, list, tuple, collections.deque)):
+        size += sum(sys.getsizeof(item) for item in container)
+    return size
+
+def process_rss():
+    """Retorna a memória residente do processo em bytes (Linux), ou None."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def memory_report():
+    """Mede as estruturas do bot e os caches do discord.py (barato, sem tracemalloc)."""
+    inventory_usage = inventory.memory_usage()
+    structures = {
+        "inventory (heap)": inventory_usage["heap_bytes"],
+        "inventory (índice)": inventory_usage["index_bytes"],
+        "user_cooldowns": container_size(user_cooldowns),
+        "pending_deletes": container_size(pending_deletes),
+        "background_tasks": container_size(background_tasks) + container_size(drain_tasks),
+        "quota_tracker": container_size(quota_tracker.counters),
+        "waitlist": sum(sys.getsizeof(queue) for queue in waitlist.queues.values()),
+        "usage_stats": sum(sys.getsizeof(ring) for rings in usage_stats.rings.values() for ring in rings.values()),
+        "admission.recent": container_size(admission.recent),
+        "stock_pages": container_size(stock_pages.pages),
+        "loop_lag_samples": container_size(loop_lag_samples)
+    }
+    counts = {
+        "user_cooldowns": len(user_cooldowns),
+        "pending_deletes": len(pending_deletes),
+        "background_tasks": len(background_tasks) + len(drain_tasks),
+        "quota_tracker": len(quota_tracker.counters),
+        "cached_messages": len(bot.cached_messages),
+        "users": len(bot.users),
+        "members": sum(len(guild.members) for guild in bot.guilds)
+    }
+    return structures, counts
+
+def take_memory_snapshot():
+    """Tira um snapshot do tracemalloc sem contar as alocações do próprio tracemalloc."""
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+
+async def sample_memory():
+    """Amostra o tracemalloc periodicamente e registra o que mais cresceu."""
+    while True:
+        snapshot = await asyncio.to_thread(take_memory_snapshot)
+        if memprofile["last"] is not None:
+            memprofile["diff"] = snapshot.compare_to(memprofile["last"], "lineno")[:10]
+            for stat in memprofile["diff"][:5]:
+                frame = stat.traceback[0]
+                print(f"[MEMPROFILE] {stat.size_diff / 1024:+.1f} KB ({stat.count_diff:+d} blocos) "
+                      f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        memprofile["last"] = snapshot
+        await asyncio.sleep(config["memprofile_interval_minutes"] * 60)
+
+def start_memprofile():
+    """Ativa o tracemalloc e a amostragem periódica."""
+    if memprofile["task"]:
+        return
+    tracemalloc.start(MEMPROFILE_FRAMES)
+    memprofile["task"] = spawn(sample_memory())
+
+def stop_memprofile():
+    """Desativa o tracemalloc e descarta os snapshots (custo zero quando desligado)."""
+    if memprofile["task"]:
+        memprofile["task"].cancel()
+    memprofile.update(task=None, last=None, diff=[])
+    tracemalloc.stop()
+
+# --- Importação de Arquivos ---
+MAX_ACCOUNT_LENGTH = 512      # Linhas maiores são rejeitadas sem serem guardadas
+IMPORT_CHUNK_SIZE = 64 * 1024 # Bytes lidos do anexo por vez
+IMPORT_PROGRESS_INTERVAL = 2  # Segundos entre edições da mensagem de progresso
+
+async def stream_attachment_lines(attachment, counts):
+    """Lê o anexo em blocos e produz cada linha (bytes), ou None para linhas longas demais.
+
+    Só a linha atual fica em memória, limitada a MAX_ACCOUNT_LENGTH bytes.
+    Os bytes lidos são somados em counts["bytes"].
+    """
+    carry = b""
+    overflow = False  # Descartando o restante de uma linha longa demais
+    async with aiohttp.ClientSession() as session:
+        async with session.get(attachment.url) as response:
+            response.raise_for_status()
+            async for chunk in response.content.iter_chunked(IMPORT_CHUNK_SIZE):
+                counts["bytes"] += len(chunk)
+                lines = chunk.split(b"\n")
+                for index, piece in enumerate(lines):
+                    if index < len(lines) - 1:
+                        # Linha completa
+                        yield None if overflow else carry + piece
+                        carry, overflow = b"", False
+                    elif not overflow:
+                        carry += piece
+                        if len(carry) > MAX_ACCOUNT_LENGTH:
+                            carry, overflow = b"", True
+    if overflow:
+        yield None
+    elif carry:
+        yield carry
+
+def parse_account_line(raw):
+    """Valida uma linha do arquivo; retorna a conta, "" para linha vazia ou None se inválida."""
+    if raw is None:
+        return None
+    try:
+        line = raw.decode("utf-8").strip().lstrip("\ufeff")
+    except UnicodeDecodeError:
+        return None
+    if not line:
+        return ""
+    if ":" not in line or len(line) > MAX_ACCOUNT_LENGTH:
+        return None
+    return line
+
+def import_progress_embed(category, attachment, counts, done=False, error=None):
+    """Monta o embed de progresso (ou resultado) da importação."""
+    if error:
+        title, color_name = "Importação Interrompida", "error"
+        description = f"Erro ao ler `{attachment.filename}`: {error}\nAs contas já gravadas foram mantidas."
+    elif done:
+        title, color_name = f"Contas {format_category_name(category)} Adicionadas", category
+        description = f"Importação de `{attachment.filename}` concluída!"
+    else:
+        title, color_name = "Importando Contas", "info"
+        percent = min(100, counts["bytes"] * 100 // attachment.size) if attachment.size else 0
+        description = f"Lendo `{attachment.filename}`... **{percent}%**"
+    
+    fields = [
+        {"name": "📄 Linhas Lidas", "value": f"{counts['lines']}", "inline": True},
+        {"name": "✅ Adicionadas", "value": f"{counts['added']}", "inline": True},
+        {"name": "♻️ Duplicadas", "value": f"{counts['duplicates']}", "inline": True},
+        {"name": "❌ Rejeitadas", "value": f"{counts['rejected']}", "inline": True}
+    ]
+    if done:
+        fields.append({
+            "name": f"{get_category_icon(category)} Total na Categoria",
+            "value": f"{inventory.count(category)}",
+            "inline": True
+        })
+    return create_embed(title=title, description=description, color_name=color_name, fields=fields)
+
+async def import_account_file(ctx, category, attachment):
+    """Importa as contas de um anexo em lotes, com progresso editado na mesma mensagem."""
+    counts = {"lines": 0, "bytes": 0, "added": 0, "duplicates": 0, "rejected": 0}
+    progress = await ctx.send(embed=import_progress_embed(category, attachment, counts))
+    last_edit = time.monotonic()
+    batch = []
+    
+    async def commit_batch():
+        # Grava o lote no diário (com deduplicação), faz o fsync fora do loop e avisa a fila de espera
+        added = inventory.add(category, batch)
+        await inventory.commit()
+        counts["added"] += added
+        counts["duplicates"] += len(batch) - added
+        usage_stats.record_add(category, added, time.time())
+        batch.clear()
+        if added and waitlist.size(category):
+            spawn(notify_waitlist(category, inventory.count(category)), drain=True)
+    
+    error = None
+    try:
+        async for raw in stream_attachment_lines(attachment, counts):
+            counts["lines"] += 1
+            account = parse_account_line(raw)
+            if account is None:
+                counts["rejected"] += 1
+            elif account:
+                batch.append(account)
+                if len(batch) >= config["import_batch_size"]:
+                    await commit_batch()
+            
+            if time.monotonic() - last_edit >= IMPORT_PROGRESS_INTERVAL:
+                last_edit = time.monotonic()
+                try:
+                    await progress.edit(embed=import_progress_embed(category, attachment, counts))
+                except discord.HTTPException:
+                    pass  # O progresso é só informativo
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        error = e
+        print(f"[ERRO] Erro ao importar {attachment.filename}: {e}")
+    finally:
+        if batch:
+            await commit_batch()
+    
+    await progress.edit(embed=import_progress_embed(category, attachment, counts, done=True, error=error))
+    schedule_delete(progress, 30)
+    # Só apaga o comando no fim: o link do anexo deixa de funcionar com a mensagem apagada
+    schedule_delete(ctx.message, 0)
+    
+    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})",
+              f"Importou arquivo de contas {category}",
+              f"Arquivo: {attachment.filename}, Linhas: {counts['lines']}, Adicionadas: {counts['added']}, "
+              f"Duplicadas: {counts['duplicates']}, Rejeitadas: {counts['rejected']}, "
+              f"Total na categoria: {inventory.count(category)}",
+              user_id=ctx.author.id, category=category)
+
 # --- Eventos do Bot ---
+@bot.event
+async def setup_hook():
+    # Inicia o monitor de atraso do event loop
+    spawn(monitor_loop_lag())
+    
+    # Aguarda o pré-carregamento antes de conectar ao gateway e receber comandos
+    started = time.perf_counter()
+    await startup_preload
+    mark_phase("preload_wait", started)
+    
+    # Salva cotas e estatísticas periodicamente
+    spawn(persist_counters())
+    
+    # Recarrega configuração e tema editados no disco
+    spawn(watch_config_files())
+    
+    # Retoma as exclusões agendadas antes do último desligamento
+    resume_pending_deletes()
+    
+    # Mantém o painel de estoque atualizado
+    spawn(update_stock_board())
+    
+    # Backups automáticos do estoque
+    spawn(scheduled_backups())
+
 @bot.event
 async def on_ready():
     print(f'Bot conectado como {bot.user.name} ({bot.user.id})')
     
+    # on_ready se repete em reconexões; a inicialização é medida só uma vez
+    if "gateway" not in startup_timings:
+        mark_phase("gateway", bot.connect_started)
+        mark_phase("total", startup_started)
+    
     # Imprime o canal de geração configurado
     channel_id = config["gen_channel_id"]
     channel = bot.get_channel(channel_id)
@@ -225,19 +2873,7 @@ async def on_ready():
     else:
         print(f'Canal de geração configurado: {channel_id} (não encontrado)')
     
-    # Verifica e cria o arquivo de contas se não existir
-    if not os.path.exists(ACCOUNTS_FILE):
-        save_accounts({})
-    
     print('------')
-    
-    # Define o status do bot
-    await bot.change_presence(
-        activity=discord.Activity(
-            type=discord.ActivityType.watching,
-            name="!gen [categoria] para uma conta"
-        )
-    )
 
 # --- Comandos ---
 @bot.command(name="gen")
@@ -273,17 +2909,14 @@ async def generate_account(ctx, category=None):
             )
             
             error_msg = await ctx.reply(embed=embed, mention_author=False)
-            await ctx.message.delete(delay=10)  # Deleta o comando após 10 segundos
-            await error_msg.delete(delay=10)  # Deleta a mensagem de erro após 10 segundos
+            schedule_delete(ctx.message, 10)  # Deleta o comando após 10 segundos
+            schedule_delete(error_msg, 10)  # Deleta a mensagem de erro após 10 segundos
             return
     
-    # Carrega as contas
-    accounts = load_accounts()
-    
     # Se não foi especificada uma categoria
     if category is None:
         # Verifica se há alguma categoria disponível
-        available_categories = [cat for cat, accs in accounts.items() if accs]
+        available_categories = inventory.available_categories()
         
         if not available_categories:
             embed = create_embed(
@@ -292,12 +2925,12 @@ async def generate_account(ctx, category=None):
                 color_name="error"
             )
             error_msg = await ctx.reply(embed=embed, mention_author=False)
-            await ctx.message.delete(delay=10)
-            await error_msg.delete(delay=10)
+            schedule_delete(ctx.message, 10)
+            schedule_delete(error_msg, 10)
             return
         
         # Mensagem de erro para especificar categoria
-        categories_text = ", ".join([f"`{cat}`" for cat in sorted(available_categories)])
+        categories_text = ", ".join([f"`{cat}`" for cat in available_categories])
         embed = create_embed(
             title="Categoria Necessária",
             description="Por favor, especifique uma categoria para gerar uma conta.",
@@ -317,26 +2950,33 @@ async def generate_account(ctx, category=None):
         )
         
         error_msg = await ctx.reply(embed=embed, mention_author=False)
-        await ctx.message.delete(delay=15)
-        await error_msg.delete(delay=15)
+        schedule_delete(ctx.message, 15)
+        schedule_delete(error_msg, 15)
         return
     
     # Normaliza o nome da categoria (minúsculo)
     category = category.lower()
     
     # Verifica se a categoria existe
-    if category not in accounts or not accounts[category]:
+    if not inventory.count(category):
         # Verifica se a categoria existe, mas está vazia
-        if category in accounts:
+        if category in inventory.categories():
             embed = create_embed(
                 title=f"Sem Contas {format_category_name(category)}",
                 description=f"Não há contas de {format_category_name(category)} disponíveis no momento.",
-                color_name="error"
+                color_name="error",
+                fields=[
+                    {
+                        "name": "🔔 Fila de Espera",
+                        "value": f"Use `!waitlist {category}` para ser avisado quando houver reabastecimento.",
+                        "inline": False
+                    }
+                ]
             )
         else:
             # A categoria não existe
-            available_categories = [cat for cat, accs in accounts.items() if accs]
-            categories_text = ", ".join([f"`{cat}`" for cat in sorted(available_categories)])
+            available_categories = inventory.available_categories()
+            categories_text = ", ".join([f"`{cat}`" for cat in available_categories])
             
             embed = create_embed(
                 title="Categoria Não Encontrada",
@@ -352,23 +2992,39 @@ async def generate_account(ctx, category=None):
             )
         
         error_msg = await ctx.reply(embed=embed, mention_author=False)
-        await ctx.message.delete(delay=10)
-        await error_msg.delete(delay=10)
+        schedule_delete(ctx.message, 10)
+        schedule_delete(error_msg, 10)
         return
     
-    # Pega a primeira conta da categoria
-    account = accounts[category][0]
-    accounts[category].pop(0)  # Remove a conta da lista
-    
-    # Remove a categoria se ficou vazia
-    if not accounts[category]:
-        accounts[category] = []
+    # Verifica as cotas de geração do usuário
+    now = time.time()
+    exceeded = quota_tracker.check(ctx.author.id, resolve_quota_limits(ctx.author, category), now)
+    if exceeded:
+        (scope, window), limit, available_at = exceeded
+        scope_text = "no total" if scope == "*" else f"de {format_category_name(scope)}"
+        embed = create_embed(
+            title="Cota Atingida",
+            description=f"Você atingiu o limite de **{limit}** contas {scope_text} por {QUOTA_WINDOW_NAMES[window]}.",
+            color_name="warning",
+            fields=[
+                {
+                    "name": "Próxima geração disponível em",
+                    "value": f"<t:{int(available_at)}:R>"
+                }
+            ]
+        )
+        error_msg = await ctx.reply(embed=embed, mention_author=False)
+        schedule_delete(ctx.message, 10)
+        schedule_delete(error_msg, 10)
+        return
     
-    # Salva a lista atualizada
-    save_accounts(accounts)
+    # Retira a próxima conta da categoria (o snapshot é atualizado no lugar)
+    account = inventory.claim(category)
     
-    # Atualiza o cooldown do usuário
+    # Atualiza o cooldown e as cotas do usuário
     user_cooldowns[user_id] = current_time
+    quota_tracker.record(ctx.author.id, category, now)
+    usage_stats.record_gen(category, now, user_id=ctx.author.id)
     
     # Envia a conta por DM
     try:
@@ -376,8 +3032,8 @@ async def generate_account(ctx, category=None):
         await ctx.message.delete()
         
         # Calcula estatísticas
-        total_accounts = sum(len(accs) for accs in accounts.values())
-        category_remaining = len(accounts.get(category, []))
+        total_accounts = inventory.total()
+        category_remaining = inventory.count(category)
         
         # Cria embed de sucesso para o canal
         success_embed = create_embed(
@@ -452,13 +3108,14 @@ async def generate_account(ctx, category=None):
         await ctx.author.send(embed=dm_embed)
         
         # Registra no log
-        total_remaining = sum(len(accs) for accs in accounts.values())
+        total_remaining = inventory.total()
         log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", 
                   f"Gerou conta {category}", 
-                  f"Restantes na categoria: {category_remaining}, Total: {total_remaining}")
+                  f"Restantes na categoria: {category_remaining}, Total: {total_remaining}",
+                  user_id=ctx.author.id, category=category)
         
         # Remove a confirmação após 15 segundos
-        await confirmation.delete(delay=15)
+        schedule_delete(confirmation, 15)
         
     except discord.Forbidden:
         # Se não puder enviar DM (usuário bloqueou DMs)
@@ -478,39 +3135,23 @@ async def generate_account(ctx, category=None):
         error_msg = await ctx.send(embed=error_embed)
         
         # Coloca a conta de volta na categoria
-        if category not in accounts:
-            accounts[category] = []
-        accounts[category].insert(0, account)
-        save_accounts(accounts)
+        inventory.unclaim(category, account)
         
-        # Remove o cooldown
+        # Remove o cooldown e desfaz o registro nas cotas
         if user_id in user_cooldowns:
             del user_cooldowns[user_id]
+        quota_tracker.record(ctx.author.id, category, now, amount=-1)
+        usage_stats.record_gen(category, now, amount=-1, user_id=ctx.author.id)
             
         # Remove a mensagem de erro após 15 segundos
-        await error_msg.delete(delay=15)
+        schedule_delete(error_msg, 15)
 
 @bot.command(name="addacc")
 async def add_account(ctx, category=None, *, accounts_text=None):
     """Adiciona uma ou mais contas à categoria especificada."""
     # Verifica se o usuário tem permissão (admin ou dono do servidor)
-    is_admin = False
-    if ctx.author.guild_permissions.administrator or ctx.author.id == ctx.guild.owner_id:
-        is_admin = True
-    elif config["admin_role_id"] != 0:
-        role = ctx.guild.get_role(config["admin_role_id"])
-        if role and role in ctx.author.roles:
-            is_admin = True
-    
-    if not is_admin:
-        error_embed = create_embed(
-            title="Permissão Negada",
-            description="Você não tem permissão para usar este comando.",
-            color_name="error"
-        )
-        error_msg = await ctx.send(embed=error_embed)
-        await ctx.message.delete(delay=5)
-        await error_msg.delete(delay=5)
+    if not is_bot_admin(ctx):
+        await deny_permission(ctx)
         return
     
     # Verifica se a categoria foi fornecida
@@ -533,8 +3174,13 @@ async def add_account(ctx, category=None, *, accounts_text=None):
             ]
         )
         error_msg = await ctx.send(embed=error_embed)
-        await ctx.message.delete(delay=10)
-        await error_msg.delete(delay=10)
+        schedule_delete(ctx.message, 10)
+        schedule_delete(error_msg, 10)
+        return
+    
+    # Arquivo anexado: importa em lotes, linha por linha
+    if ctx.message.attachments:
+        await import_account_file(ctx, category.lower(), ctx.message.attachments[0])
         return
     
     # Verifica se as contas foram fornecidas
@@ -548,12 +3194,17 @@ async def add_account(ctx, category=None, *, accounts_text=None):
                     "name": "Formato Correto",
                     "value": "```!addacc [categoria]\nlogin1:senha1\nlogin2:senha2```",
                     "inline": False
+                },
+                {
+                    "name": "Arquivo",
+                    "value": "Ou anexe um arquivo `.txt` com uma conta `login:senha` por linha",
+                    "inline": False
                 }
             ]
         )
         error_msg = await ctx.send(embed=error_embed)
-        await ctx.message.delete(delay=10)
-        await error_msg.delete(delay=10)
+        schedule_delete(ctx.message, 10)
+        schedule_delete(error_msg, 10)
         return
     
     # Deleta o comando original para proteger as contas
@@ -571,31 +3222,24 @@ async def add_account(ctx, category=None, *, accounts_text=None):
             description="Nenhuma conta válida encontrada. Use o formato `login:senha`.",
             color_name="error"
         )
-        error_msg = await ctx.send(embed=error_embed)
-        await error_msg.delete(delay=10)
-        return
-    
-    # Carrega as contas existentes
-    accounts = load_accounts()
-    
-    # Adiciona a categoria se não existir
-    if category not in accounts:
-        accounts[category] = []
-    
-    # Adiciona as novas contas à categoria
-    accounts[category].extend(new_accounts)
+        error_msg = await ctx.send(embed=error_embed)
+        schedule_delete(error_msg, 10)
+        return
     
-    # Salva todas as contas
-    save_accounts(accounts)
+    # Adiciona as novas contas à categoria (cria a categoria se não existir)
+    added_count = inventory.add(category, new_accounts)
+    await inventory.commit()
+    usage_stats.record_add(category, added_count, time.time())
+    skipped_count = len(new_accounts) - added_count
     
     # Conta o total de contas
-    total_accounts = sum(len(accs) for accs in accounts.values())
-    category_total = len(accounts[category])
+    total_accounts = inventory.total()
+    category_total = inventory.count(category)
     
     # Envia confirmação
     success_embed = create_embed(
         title=f"Contas {format_category_name(category)} Adicionadas",
-        description=f"{len(new_accounts)} contas de {format_category_name(category)} adicionadas com sucesso!",
+        description=f"{added_count} contas de {format_category_name(category)} adicionadas com sucesso!",
         color_name=category,
         fields=[
             {
@@ -608,6 +3252,11 @@ async def add_account(ctx, category=None, *, accounts_text=None):
                 "value": f"{total_accounts}",
                 "inline": True
             },
+            {
+                "name": "♻️ Duplicadas Ignoradas",
+                "value": f"{skipped_count}",
+                "inline": True
+            },
             {
                 "name": "👤 Adicionadas por",
                 "value": f"{ctx.author.mention}",
@@ -617,12 +3266,84 @@ async def add_account(ctx, category=None, *, accounts_text=None):
     )
     
     confirmation = await ctx.send(embed=success_embed)
-    await confirmation.delete(delay=10)
+    schedule_delete(confirmation, 10)
     
     # Registra no log
     log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", 
               f"Adicionou contas {category}", 
-              f"Quantidade: {len(new_accounts)}, Total na categoria: {category_total}, Total geral: {total_accounts}")
+              f"Quantidade: {added_count}, Duplicadas: {skipped_count}, Total na categoria: {category_total}, Total geral: {total_accounts}",
+              user_id=ctx.author.id, category=category)
+    
+    # Avisa quem estava aguardando o reabastecimento
+    if added_count and waitlist.size(category):
+        spawn(notify_waitlist(category, category_total), drain=True)
+
+@bot.command(name="waitlist")
+async def join_waitlist(ctx, category=None):
+    """Entra na fila de espera de uma categoria sem contas."""
+    # Verifica se o comando foi enviado no canal correto
+    if ctx.channel.id != config["gen_channel_id"]:
+        return
+    
+    if category is None:
+        error_embed = create_embed(
+            title="Categoria Necessária",
+            description="Por favor, especifique a categoria que deseja aguardar.",
+            color_name="warning",
+            fields=[
+                {
+                    "name": "Exemplo de Uso",
+                    "value": "`!waitlist valorant`",
+                    "inline": False
+                }
+            ]
+        )
+        schedule_delete(await ctx.send(embed=error_embed), 10)
+        schedule_delete(ctx.message, 10)
+        return
+    
+    category = category.lower()
+    
+    # Só faz sentido aguardar categorias conhecidas que estão vazias
+    if category not in inventory.categories() or inventory.count(category):
+        if inventory.count(category):
+            description = f"Há contas de {format_category_name(category)} disponíveis. Use `!gen {category}`."
+        else:
+            description = f"A categoria `{category}` não existe."
+        error_embed = create_embed(
+            title="Fila de Espera Indisponível",
+            description=description,
+            color_name="warning"
+        )
+        schedule_delete(await ctx.send(embed=error_embed), 10)
+        schedule_delete(ctx.message, 10)
+        return
+    
+    position, joined = waitlist.join(category, ctx.author.id)
+    if joined:
+        await waitlist.persist()
+    
+    embed = create_embed(
+        title=f"Fila de Espera {format_category_name(category)}",
+        description=f"{ctx.author.mention} você será avisado aqui quando a categoria for reabastecida.",
+        color_name=category,
+        fields=[
+            {
+                "name": "🔔 Posição na Fila",
+                "value": f"{position}",
+                "inline": True
+            }
+        ]
+    )
+    schedule_delete(await ctx.send(embed=embed), 15)
+    schedule_delete(ctx.message, 15)
+    
+    # Registra no log
+    if joined:
+        log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", 
+                  f"Entrou na fila de espera {category}", 
+                  f"Posição: {position}",
+                  user_id=ctx.author.id, category=category)
 
 @bot.command(name="stock")
 async def check_stock(ctx):
@@ -631,75 +3352,104 @@ async def check_stock(ctx):
     if ctx.channel.id != config["gen_channel_id"]:
         return
     
-    # Carrega as contas
-    accounts = load_accounts()
+    # Agrupa pedidos repetidos no mesmo canal em uma única resposta
+    if admission.should_coalesce(("stock", ctx.channel.id), config["stock_coalesce_seconds"]):
+        await ctx.message.delete()
+        return
     
     # Verifica se há contas disponíveis
-    if not accounts or all(len(accs) == 0 for accs in accounts.values()):
+    if not inventory.total():
         embed = create_embed(
             title="Estoque Vazio",
             description="Não há contas disponíveis no momento.",
             color_name="warning"
         )
-        await ctx.send(embed=embed, delete_after=10)
-        await ctx.message.delete(delay=10)
+        schedule_delete(await ctx.send(embed=embed), 10)
+        schedule_delete(ctx.message, 10)
         return
     
-    # Filtra apenas categorias não vazias e ordena por nome
-    categories = {cat: accs for cat, accs in accounts.items() if accs}
-    sorted_categories = sorted(categories.keys())
-    
     # Calcula o total de contas
-    total_accounts = sum(len(accs) for accs in accounts.values())
-    
-    # Cria o embed base
-    stock_embed = create_embed(
-        title="Estoque de Contas",
-        description=f"Temos um total de **{total_accounts}** contas disponíveis em **{len(categories)}** categorias.",
-        color_name="stock"
-    )
-    
-    # Adiciona campos para cada categoria com ícones e cores personalizadas
-    for category in sorted_categories:
-        category_icon = get_category_icon(category)
-        category_count = len(accounts[category])
-        
-        # Adiciona o campo da categoria
-        stock_embed.add_field(
-            name=f"{category_icon} {format_category_name(category)}",
-            value=f"**{category_count}** contas disponíveis\n`!gen {category}`",
-            inline=True
-        )
+    total_accounts = inventory.total()
     
-    # Adiciona informações de cooldown
-    if config["cooldown_minutes"] > 0:
-        stock_embed.add_field(
-            name=f"{EMOJIS['time']} Tempo de Espera",
-            value=f"**{config['cooldown_minutes']}** minutos entre gerações",
-            inline=False
+    # Com o painel ativo e mostrando todo o estoque, aponta para ele em vez de publicar outro
+    board_url = stock_board_url()
+    if board_url and stock_board_embeds()[1]:
+        embed = create_embed(
+            title="Estoque de Contas",
+            description=f"Temos **{total_accounts}** contas disponíveis. O estoque atualizado fica sempre [neste painel]({board_url}).",
+            color_name="stock"
         )
+        schedule_delete(await ctx.send(embed=embed), 10)
+        schedule_delete(ctx.message, 10)
+        return
     
-    # Se o bot tiver um avatar, usa como thumbnail
-    if bot.user.avatar:
-        stock_embed.set_thumbnail(url=bot.user.avatar.url)
-    
-    # Adiciona timestamp dinâmico no footer
-    stock_embed.set_footer(text=f"{bot.user.name} • Atualizado")
-    
-    # Envia o embed de estoque
-    await ctx.send(embed=stock_embed)
+    # Envia apenas a primeira página; as demais são montadas ao navegar
+    if stock_pages.page_count() > 1:
+        view = StockView()
+        view.message = await ctx.send(embed=stock_pages.render(0), view=view)
+    else:
+        await ctx.send(embed=stock_pages.render(0))
     await ctx.message.delete()
     
     # Registra no log
     log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", 
               "Consultou estoque", 
-              f"Total de contas: {total_accounts}")
+              f"Total de contas: {total_accounts}",
+              user_id=ctx.author.id)
 
 @bot.command(name="remaining")
 async def remaining_accounts(ctx):
     """Alias para o comando !stock, mantido para compatibilidade"""
     await check_stock(ctx)
 
+@bot.command(name="stockboard")
+async def set_stock_board(ctx, mode=None):
+    """Cria (ou desativa com `off`) o painel de estoque atualizado automaticamente."""
+    if not is_bot_admin(ctx):
+        await deny_permission(ctx)
+        return
+    
+    channel = bot.get_channel(config["gen_channel_id"])
+    if not channel:
+        error_embed = create_embed(
+            title="Canal Não Configurado",
+            description="Defina o canal de geração com `!setchannel` antes de criar o painel.",
+            color_name="error"
+        )
+        schedule_delete(await ctx.send(embed=error_embed), 10)
+        schedule_delete(ctx.message, 10)
+        return
+    
+    # Remove o painel anterior, se houver
+    previous_id = config["stock_board_message_id"]
+    if previous_id:
+        try:
+            await channel.get_partial_message(previous_id).delete()
+        except discord.HTTPException:
+            pass
+    
+    new_config = thaw(config)
+    if mode and mode.lower() == "off":
+        new_config["stock_board_message_id"] = 0
+        description = "Painel de estoque desativado. `!stock` volta a publicar o estoque."
+    else:
+        embeds, _ = stock_board_embeds()
+        board = await channel.send(embeds=embeds)
+        new_config["stock_board_message_id"] = board.id
+        description = f"Painel de estoque criado em {channel.mention}. Ele é atualizado automaticamente."
+    await save_config(new_config)
+    
+    success_embed = create_embed(
+        title="Painel de Estoque",
+        description=description,
+        color_name="config"
+    )
+    schedule_delete(await ctx.send(embed=success_embed), 15)
+    schedule_delete(ctx.message, 15)
+    
+    # Registra no log
+    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Alterou painel de estoque", f"Mensagem: {new_config['stock_board_message_id']}", user_id=ctx.author.id)
+
 @bot.command(name="setchannel")
 async def set_channel(ctx, channel_id: int = None):
     """Define o canal onde o comando !gen funcionará."""
@@ -711,8 +3461,8 @@ async def set_channel(ctx, channel_id: int = None):
             color_name="error"
         )
         error_msg = await ctx.send(embed=error_embed)
-        await ctx.message.delete(delay=5)
-        await error_msg.delete(delay=5)
+        schedule_delete(ctx.message, 5)
+        schedule_delete(error_msg, 5)
         return
     
     # Se não foi fornecido um ID, usa o canal atual
@@ -728,13 +3478,14 @@ async def set_channel(ctx, channel_id: int = None):
             color_name="error"
         )
         error_msg = await ctx.send(embed=error_embed)
-        await ctx.message.delete(delay=10)
-        await error_msg.delete(delay=10)
+        schedule_delete(ctx.message, 10)
+        schedule_delete(error_msg, 10)
         return
     
     # Atualiza a configuração
-    config["gen_channel_id"] = channel_id
-    save_config()
+    new_config = thaw(config)
+    new_config["gen_channel_id"] = channel_id
+    await save_config(new_config)
     
     # Envia confirmação
     success_embed = create_embed(
@@ -755,11 +3506,11 @@ async def set_channel(ctx, channel_id: int = None):
         ]
     )
     
-    await ctx.send(embed=success_embed, delete_after=15)
-    await ctx.message.delete(delay=15)
+    schedule_delete(await ctx.send(embed=success_embed), 15)
+    schedule_delete(ctx.message, 15)
     
     # Registra no log
-    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Alterou canal", f"Novo canal: {channel_id}")
+    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Alterou canal", f"Novo canal: {channel_id}", user_id=ctx.author.id)
 
 @bot.command(name="setcooldown")
 async def set_cooldown(ctx, minutes: int):
@@ -772,8 +3523,8 @@ async def set_cooldown(ctx, minutes: int):
             color_name="error"
         )
         error_msg = await ctx.send(embed=error_embed)
-        await ctx.message.delete(delay=5)
-        await error_msg.delete(delay=5)
+        schedule_delete(ctx.message, 5)
+        schedule_delete(error_msg, 5)
         return
     
     # Verifica se o valor é válido
@@ -784,13 +3535,15 @@ async def set_cooldown(ctx, minutes: int):
             color_name="error"
         )
         error_msg = await ctx.send(embed=error_embed)
-        await ctx.message.delete(delay=10)
-        await error_msg.delete(delay=10)
+        schedule_delete(ctx.message, 10)
+        schedule_delete(error_msg, 10)
         return
     
     # Atualiza a configuração
-    config["cooldown_minutes"] = minutes
-    save_config()
+    previous_minutes = config["cooldown_minutes"]
+    new_config = thaw(config)
+    new_config["cooldown_minutes"] = minutes
+    await save_config(new_config)
     
     # Texto personalizado para o cooldown
     cooldown_text = f"{minutes} minutos" if minutes > 0 else "desativado"
@@ -803,7 +3556,7 @@ async def set_cooldown(ctx, minutes: int):
         fields=[
             {
                 "name": "Valor Anterior",
-                "value": f"{config.get('cooldown_minutes', 60)} minutos",
+                "value": f"{previous_minutes} minutos",
                 "inline": True
             },
             {
@@ -814,11 +3567,11 @@ async def set_cooldown(ctx, minutes: int):
         ]
     )
     
-    await ctx.send(embed=success_embed, delete_after=15)
-    await ctx.message.delete(delay=15)
+    schedule_delete(await ctx.send(embed=success_embed), 15)
+    schedule_delete(ctx.message, 15)
     
     # Registra no log
-    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Alterou cooldown", f"Novo cooldown: {minutes} minutos")
+    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Alterou cooldown", f"Novo cooldown: {minutes} minutos", user_id=ctx.author.id)
 
 @bot.command(name="setadmin")
 async def set_admin_role(ctx, role_id: int):
@@ -831,8 +3584,8 @@ async def set_admin_role(ctx, role_id: int):
             color_name="error"
         )
         error_msg = await ctx.send(embed=error_embed)
-        await ctx.message.delete(delay=5)
-        await error_msg.delete(delay=5)
+        schedule_delete(ctx.message, 5)
+        schedule_delete(error_msg, 5)
         return
     
     # Verifica se o cargo existe
@@ -844,13 +3597,14 @@ async def set_admin_role(ctx, role_id: int):
             color_name="error"
         )
         error_msg = await ctx.send(embed=error_embed)
-        await ctx.message.delete(delay=10)
-        await error_msg.delete(delay=10)
+        schedule_delete(ctx.message, 10)
+        schedule_delete(error_msg, 10)
         return
     
     # Atualiza a configuração
-    config["admin_role_id"] = role_id
-    save_config()
+    new_config = thaw(config)
+    new_config["admin_role_id"] = role_id
+    await save_config(new_config)
     
     # Envia confirmação
     success_embed = create_embed(
@@ -871,23 +3625,399 @@ async def set_admin_role(ctx, role_id: int):
         ]
     )
     
-    await ctx.send(embed=success_embed, delete_after=15)
-    await ctx.message.delete(delay=15)
+    schedule_delete(await ctx.send(embed=success_embed), 15)
+    schedule_delete(ctx.message, 15)
+    
+    # Registra no log
+    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Alterou cargo admin", f"Novo cargo: {role_id}", user_id=ctx.author.id)
+
+@bot.command(name="history")
+async def show_history(ctx, target=None, days: int = 0):
+    """Mostra o histórico de um usuário ou categoria, opcionalmente dos últimos N dias."""
+    if not is_bot_admin(ctx):
+        await deny_permission(ctx)
+        return
+    
+    if target is None:
+        error_embed = create_embed(
+            title="Alvo Necessário",
+            description="Use `!history [@usuário ou categoria] [dias]`.",
+            color_name="error",
+            fields=[
+                {
+                    "name": "Exemplos",
+                    "value": "`!history @usuario 7`\n`!history valorant`",
+                    "inline": False
+                }
+            ]
+        )
+        schedule_delete(await ctx.send(embed=error_embed), 10)
+        schedule_delete(ctx.message, 10)
+        return
+    
+    # Menção ou ID busca por usuário; qualquer outro texto, por categoria
+    user_id = target.strip("<@!>")
+    since = time.time() - days * 86400 if days > 0 else 0.0
+    period = f" ({days} dias)" if days > 0 else ""
+    if user_id.isdigit():
+        view = HistoryView(f"Histórico de {target}{period}", user_id=int(user_id), since=since)
+    else:
+        view = HistoryView(f"Histórico {format_category_name(target)}{period}", category=target.lower(), since=since)
+    
+    await view.load(0)
+    view.message = await ctx.send(embed=view.embed(), view=view)
+    schedule_delete(view.message, 300)
+    schedule_delete(ctx.message, 10)
+
+@bot.command(name="stats")
+async def show_stats(ctx, category=None):
+    """Mostra o ritmo de geração por categoria, maiores consumidores e previsão de esgotamento."""
+    if not is_bot_admin(ctx):
+        await deny_permission(ctx)
+        return
+    
+    now = time.time()
+    if category:
+        categories = [category.lower()]
+    else:
+        # Categorias mais movimentadas primeiro (limite de campos do embed)
+        categories = sorted(
+            usage_stats.categories() | set(inventory.categories()),
+            key=lambda cat: (-usage_stats.last_day("gens", cat, now), cat)
+        )[:20]
+    
+    fields = []
+    for cat in categories:
+        stock = inventory.count(cat)
+        fields.append({
+            "name": f"{get_category_icon(cat)} {format_category_name(cat)}",
+            "value": f"Gerações: **{usage_stats.last_hour('gens', cat, now):.0f}**/hora • "
+                     f"**{usage_stats.last_day('gens', cat, now)}**/24h\n"
+                     f"Adicionadas (24h): **{usage_stats.last_day('adds', cat, now)}**\n"
+                     f"Estoque: **{stock}** • Esgota em: **{format_hours(usage_stats.hours_to_empty(cat, stock, now))}**",
+            "inline": True
+        })
+    
+    # Maiores consumidores mantidos pelas estatísticas a cada geração
+    top_users = usage_stats.top_consumers(category.lower() if category else "*", now)
+    if top_users:
+        fields.append({
+            "name": "🏆 Maiores Consumidores (24h)",
+            "value": "\n".join(f"<@{user_id}> - **{count}**" for user_id, count in top_users),
+            "inline": False
+        })
+    
+    stats_embed = create_embed(
+        title="Estatísticas de Uso",
+        description=f"Gerações e adições das últimas 24 horas em **{len(categories)}** categorias.",
+        color_name="stats",
+        fields=fields
+    )
+    schedule_delete(await ctx.send(embed=stats_embed), 60)
+    schedule_delete(ctx.message, 60)
+
+@bot.command(name="setquota")
+async def set_quota(ctx, window=None, limit: int = None, target=None):
+    """Define uma cota de geração padrão, por cargo ou por categoria."""
+    if not is_bot_admin(ctx):
+        await deny_permission(ctx)
+        return
+    
+    # Identifica o alvo: padrão, cargo (menção ou ID) ou categoria
+    role_id = target.strip("<@&>") if target else ""
+    role = ctx.guild.get_role(int(role_id)) if role_id.isdigit() else None
+    
+    # -1 só vale para cargos: remove a cota do cargo na janela, que volta a herdar o padrão
+    if window not in QUOTA_WINDOWS or limit is None or limit < (-1 if role else 0):
+        error_embed = create_embed(
+            title="Cota Inválida",
+            description="Use `!setquota [hour|day] [limite] [categoria ou @cargo]` (limite 0 = sem limite; -1 faz o cargo voltar ao padrão).",
+            color_name="error",
+            fields=[
+                {
+                    "name": "Exemplos",
+                    "value": "`!setquota day 3` - padrão por usuário\n"
+                             "`!setquota hour 5 @VIP` - total para o cargo\n"
+                             "`!setquota day 1 netflix` - por usuário na categoria",
+                    "inline": False
+                }
+            ]
+        )
+        schedule_delete(await ctx.send(embed=error_embed), 15)
+        schedule_delete(ctx.message, 15)
+        return
+    
+    new_config = thaw(config)
+    quotas = new_config["quotas"]
+    if target is None:
+        limits = quotas["default"]
+        target_text = "Padrão"
+    elif role:
+        limits = quotas["roles"].setdefault(str(role.id), {})
+        target_text = role.mention
+    else:
+        limits = quotas["categories"].setdefault(target.lower(), {})
+        target_text = format_category_name(target)
+    
+    if limit < 0:
+        limits.pop(window, None)
+    else:
+        limits[window] = limit
+    # Remove entradas vazias; em cargos o 0 explícito libera a janela e é mantido
+    quotas["roles"] = {key: value for key, value in quotas["roles"].items() if value}
+    quotas["categories"] = {key: value for key, value in quotas["categories"].items() if any(value.values())}
+    await save_config(new_config)
+    
+    if limit < 0:
+        limit_text = "herda o padrão"
+    else:
+        limit_text = f"**{limit}** por {QUOTA_WINDOW_NAMES[window]}" if limit else "sem limite"
+    success_embed = create_embed(
+        title="Cota Atualizada",
+        description=f"Cota de {target_text}: {limit_text}.",
+        color_name="config",
+        fields=[
+            {
+                "name": "Alterado por",
+                "value": f"{ctx.author.mention}",
+                "inline": True
+            }
+        ]
+    )
+    schedule_delete(await ctx.send(embed=success_embed), 15)
+    schedule_delete(ctx.message, 15)
+    
+    # Registra no log
+    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Alterou cota", f"Alvo: {target or 'padrão'}, Janela: {window}, Limite: {limit}", user_id=ctx.author.id)
+
+@bot.command(name="setpolicy")
+async def set_dispense_policy(ctx, category=None, policy=None):
+    """Define o modo de entrega de contas de uma categoria."""
+    if not is_bot_admin(ctx):
+        await deny_permission(ctx)
+        return
+    
+    policies_text = "\n".join(f"`{name}` - {description}" for name, description in DISPENSE_POLICIES.items())
+    if category is None or policy is None or policy.lower() not in DISPENSE_POLICIES:
+        error_embed = create_embed(
+            title="Modo Inválido",
+            description="Use `!setpolicy [categoria] [modo]`.",
+            color_name="error",
+            fields=[
+                {
+                    "name": "Modos Disponíveis",
+                    "value": policies_text,
+                    "inline": False
+                }
+            ]
+        )
+        schedule_delete(await ctx.send(embed=error_embed), 15)
+        schedule_delete(ctx.message, 15)
+        return
+    
+    category = category.lower()
+    policy = policy.lower()
+    previous = config["dispense_policies"].get(category, "fifo")
+    
+    # Atualiza a configuração ("fifo" é o padrão e não precisa ser salvo)
+    new_config = thaw(config)
+    if policy == "fifo":
+        new_config["dispense_policies"].pop(category, None)
+    else:
+        new_config["dispense_policies"][category] = policy
+    await save_config(new_config)
+    
+    success_embed = create_embed(
+        title="Modo de Entrega Atualizado",
+        description=f"Contas de {format_category_name(category)} agora usam o modo **{policy}**.",
+        color_name="config",
+        fields=[
+            {
+                "name": "Modo Anterior",
+                "value": f"`{previous}`",
+                "inline": True
+            },
+            {
+                "name": "Alterado por",
+                "value": f"{ctx.author.mention}",
+                "inline": True
+            }
+        ]
+    )
+    schedule_delete(await ctx.send(embed=success_embed), 15)
+    schedule_delete(ctx.message, 15)
+    
+    # Registra no log
+    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Alterou modo de entrega", f"Categoria: {category}, Modo: {policy}", user_id=ctx.author.id, category=category)
+
+@bot.command(name="backup")
+async def backup_command(ctx):
+    """Grava um backup compactado do estoque sem interromper as gerações."""
+    if not is_bot_admin(ctx):
+        await deny_permission(ctx)
+        return
+    
+    try:
+        path, accounts, size, cut_ms = await backup_inventory()
+    except Exception as e:
+        print(f"[ERRO] Erro ao fazer backup: {e}")
+        error_embed = create_embed(
+            title="Erro no Backup",
+            description="Não foi possível gravar o backup. Verifique o console.",
+            color_name="error"
+        )
+        schedule_delete(await ctx.send(embed=error_embed), 10)
+        schedule_delete(ctx.message, 10)
+        return
+    
+    success_embed = create_embed(
+        title="Backup Concluído",
+        description=f"**{accounts}** contas salvas em `{path}`.",
+        color_name="success",
+        fields=[
+            {
+                "name": "Tamanho",
+                "value": f"{size / 1024:.1f} KB",
+                "inline": True
+            },
+            {
+                "name": "Corte Consistente",
+                "value": f"{cut_ms:.1f} ms",
+                "inline": True
+            }
+        ]
+    )
+    schedule_delete(await ctx.send(embed=success_embed), 15)
+    schedule_delete(ctx.message, 15)
+    
+    # Registra no log
+    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Fez backup", f"Arquivo: {path}, Contas: {accounts}", user_id=ctx.author.id)
+
+@bot.command(name="memprofile")
+async def memory_profile(ctx, mode=None):
+    """Mostra o uso de memória; `start`/`stop` ligam o rastreamento de alocações."""
+    if not is_bot_admin(ctx):
+        await deny_permission(ctx)
+        return
+    
+    mode = (mode or "").lower()
+    if mode == "start":
+        start_memprofile()
+    elif mode == "stop":
+        stop_memprofile()
+    
+    structures, counts = memory_report()
+    rss = process_rss()
+    fields = [
+        {
+            "name": "🧱 Estruturas do Bot",
+            "value": "\n".join(
+                f"`{name}`: {size / 1024:.1f} KB"
+                for name, size in sorted(structures.items(), key=lambda item: -item[1])
+            ),
+            "inline": False
+        },
+        {
+            "name": "🔢 Contagens",
+            "value": "\n".join(f"`{name}`: {count}" for name, count in counts.items()),
+            "inline": False
+        }
+    ]
+    
+    if tracemalloc.is_tracing():
+        # Top de alocações atuais e diferença em relação à última amostra
+        snapshot = await asyncio.to_thread(take_memory_snapshot)
+        top = snapshot.statistics("lineno")[:8]
+        fields.append({
+            "name": "📍 Maiores Alocações",
+            "value": "\n".join(
+                f"`{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}` "
+                f"{stat.size / 1024:.1f} KB ({stat.count} blocos)"
+                for stat in top
+            ) or "Nenhuma",
+            "inline": False
+        })
+        if memprofile["last"] is not None:
+            diff = snapshot.compare_to(memprofile["last"], "lineno")[:8]
+            fields.append({
+                "name": "📈 Crescimento Desde a Última Amostra",
+                "value": "\n".join(
+                    f"`{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}` "
+                    f"{stat.size_diff / 1024:+.1f} KB"
+                    for stat in diff
+                ) or "Nenhum",
+                "inline": False
+            })
+        traced, peak = tracemalloc.get_traced_memory()
+        status = f"Rastreamento **ativo** • {traced / 1024 / 1024:.1f} MB rastreados (pico {peak / 1024 / 1024:.1f} MB)"
+    else:
+        status = "Rastreamento **desligado** • use `!memprofile start` para ver as alocações"
+    
+    rss_text = f"Memória residente: **{rss / 1024 / 1024:.1f} MB**\n" if rss else ""
+    profile_embed = create_embed(
+        title="Perfil de Memória",
+        description=f"{rss_text}{status}",
+        color_name="stats",
+        fields=fields
+    )
+    schedule_delete(await ctx.send(embed=profile_embed), 120)
+    schedule_delete(ctx.message, 120)
+
+@bot.command(name="exportacc")
+async def export_accounts(ctx):
+    """Exporta o estoque atual para o arquivo JSON."""
+    if not is_bot_admin(ctx):
+        await deny_permission(ctx)
+        return
+    
+    total, categories = await inventory.export_file()
+    
+    success_embed = create_embed(
+        title="Estoque Exportado",
+        description=f"**{total}** contas em **{categories}** categorias exportadas para `{ACCOUNTS_FILE}`.",
+        color_name="success"
+    )
+    schedule_delete(await ctx.send(embed=success_embed), 15)
+    schedule_delete(ctx.message, 15)
+    
+    # Registra no log
+    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Exportou contas", f"Total geral: {total}", user_id=ctx.author.id)
+
+@bot.command(name="importacc")
+async def import_accounts(ctx):
+    """Substitui o estoque pelo conteúdo do arquivo JSON."""
+    if not is_bot_admin(ctx):
+        await deny_permission(ctx)
+        return
+    
+    if not os.path.exists(ACCOUNTS_FILE):
+        error_embed = create_embed(
+            title="Arquivo Não Encontrado",
+            description=f"O arquivo `{ACCOUNTS_FILE}` não existe.",
+            color_name="error"
+        )
+        schedule_delete(await ctx.send(embed=error_embed), 10)
+        schedule_delete(ctx.message, 10)
+        return
+    
+    await inventory.import_file(load_accounts)
+    
+    success_embed = create_embed(
+        title="Estoque Importado",
+        description=f"**{inventory.total()}** contas em **{len(inventory.categories())}** categorias importadas de `{ACCOUNTS_FILE}`.",
+        color_name="success"
+    )
+    schedule_delete(await ctx.send(embed=success_embed), 15)
+    schedule_delete(ctx.message, 15)
     
     # Registra no log
-    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Alterou cargo admin", f"Novo cargo: {role_id}")
+    log_action(f"{ctx.author.name}#{ctx.author.discriminator} ({ctx.author.id})", "Importou contas", f"Total geral: {inventory.total()}", user_id=ctx.author.id)
 
 @bot.command(name="commands")
 async def command_help(ctx):
     """Mostra informações de ajuda sobre os comandos do bot."""
     # Determina se o usuário é administrador
-    is_admin = False
-    if ctx.author.guild_permissions.administrator or ctx.author.id == ctx.guild.owner_id:
-        is_admin = True
-    elif config["admin_role_id"] != 0:
-        role = ctx.guild.get_role(config["admin_role_id"])
-        if role and role in ctx.author.roles:
-            is_admin = True
+    is_admin = is_bot_admin(ctx)
     
     # Comandos para usuários normais
     user_commands = [
@@ -901,6 +4031,11 @@ async def command_help(ctx):
             "value": "Mostra as categorias e quantidades de contas disponíveis",
             "inline": False
         },
+        {
+            "name": "!waitlist [categoria]",
+            "value": "Entra na fila de espera e avisa quando a categoria for reabastecida",
+            "inline": False
+        },
         {
             "name": "!commands",
             "value": "Mostra esta mensagem de ajuda",
@@ -912,7 +4047,7 @@ async def command_help(ctx):
     admin_commands = [
         {
             "name": "!addacc [categoria]",
-            "value": "Adiciona contas à categoria especificada (formato: login:senha)",
+            "value": "Adiciona contas à categoria especificada (formato: login:senha, no texto ou em um arquivo .txt anexado)",
             "inline": False
         },
         {
@@ -929,12 +4064,51 @@ async def command_help(ctx):
             "name": "!setadmin [ID]",
             "value": "Define o cargo com permissões admin",
             "inline": False
+        },
+        {
+            "name": "!stockboard [off]",
+            "value": "Cria um painel de estoque no canal de geração, editado automaticamente",
+            "inline": False
+        },
+        {
+            "name": "!history [@usuário ou categoria] [dias]",
+            "value": "Mostra o histórico de gerações e ações, com paginação",
+            "inline": False
+        },
+        {
+            "name": "!stats [categoria]",
+            "value": "Mostra gerações por hora/dia, maiores consumidores e previsão de esgotamento",
+            "inline": False
+        },
+        {
+            "name": "!setquota [hour|day] [limite] [alvo]",
+            "value": "Define cotas de geração (padrão, por cargo ou por categoria)",
+            "inline": False
+        },
+        {
+            "name": "!setpolicy [categoria] [modo]",
+            "value": "Define o modo de entrega da categoria (fifo, random ou weighted)",
+            "inline": False
+        },
+        {
+            "name": "!memprofile [start|stop]",
+            "value": "Mostra o uso de memória do bot; start/stop ligam o rastreamento de alocações",
+            "inline": False
+        },
+        {
+            "name": "!backup",
+            "value": f"Grava um backup compactado do estoque em `{BACKUP_DIR}/` sem pausar as gerações",
+            "inline": False
+        },
+        {
+            "name": "!exportacc / !importacc",
+            "value": f"Exporta o estoque para `{ACCOUNTS_FILE}` ou substitui o estoque pelo conteúdo do arquivo",
+            "inline": False
         }
     ]
     
-    # Carrega as contas para mostrar categorias disponíveis
-    accounts = load_accounts()
-    available_categories = sorted([cat for cat, accs in accounts.items() if accs])
+    # Obtém as categorias disponíveis
+    available_categories = inventory.available_categories()
     
     # Cria o embed de ajuda
     help_embed = create_embed(
@@ -997,8 +4171,8 @@ async def command_help(ctx):
         help_embed.set_thumbnail(url=bot.user.avatar.url)
     
     # Envia a mensagem
-    await ctx.send(embed=help_embed, delete_after=30)
-    await ctx.message.delete(delay=30)
+    schedule_delete(await ctx.send(embed=help_embed), 30)
+    schedule_delete(ctx.message, 30)
 
 # --- Manipulador de erros para comandos ---
 @bot.event
@@ -1026,8 +4200,7 @@ async def on_command_error(ctx, error):
             )
         elif ctx.command.name == "gen" and param_name == "category":
             # Erro específico para !gen sem categoria
-            accounts = load_accounts()
-            available_categories = sorted([cat for cat, accs in accounts.items() if accs])
+            available_categories = inventory.available_categories()
             
             if not available_categories:
                 error_embed = create_embed(
@@ -1064,8 +4237,8 @@ async def on_command_error(ctx, error):
                 ]
             )
         
-        await ctx.send(embed=error_embed, delete_after=10)
-        await ctx.message.delete(delay=10)
+        schedule_delete(await ctx.send(embed=error_embed), 10)
+        schedule_delete(ctx.message, 10)
         return
     
     # Outros erros (para depuração)
@@ -1073,8 +4246,9 @@ async def on_command_error(ctx, error):
 
 # --- Bloco principal ---
 if __name__ == "__main__":
-    # Carrega a configuração
-    load_config()
+    # Inicia a gravação da auditoria
+    # (configuração, estoque e estado são carregados em paralelo com o login, em run_bot)
+    audit_store.start()
     
     # Obtém o token do ambiente
     TOKEN = os.getenv("BOT_TOKEN")
@@ -1085,7 +4259,8 @@ if __name__ == "__main__":
     
     # Inicia o bot
     try:
-        bot.run(TOKEN)
+        discord.utils.setup_logging()
+        asyncio.run(run_bot(TOKEN))
     except discord.LoginFailure:
         print("[ERRO] Token inválido. Verifique o token e tente novamente.")
     except Exception as e: